@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StockValuation.settings')
 
 application = get_asgi_application()
+
+if settings.PRELOAD_IMPORTS:
+    from roi_calculator.startup import preload
+    preload()
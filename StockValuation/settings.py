@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 from pathlib import Path
 # import environ
 import os
+import tempfile
 
 # env = environ.Env(
 #     # set casting, default value
@@ -47,12 +48,23 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize',
-    'django_plotly_dash.apps.DjangoPlotlyDashConfig',
     'roi_calculator'
 ]
 
+# No page uses a Dash app. django_plotly_dash loads Dash and Flask with the apps, so it is
+# only installed on request.
+DASH_ENABLED = int(os.environ.get('DASH_ENABLED', default=0))
+if DASH_ENABLED:
+    INSTALLED_APPS.insert(-1, 'django_plotly_dash.apps.DjangoPlotlyDashConfig')
+
+# Import the views and the heavy libraries (see roi_calculator.startup) when the WSGI/ASGI
+# application is created instead of on the first request. Meant for `gunicorn --preload`,
+# where the master imports them once and the forked workers share them.
+PRELOAD_IMPORTS = int(os.environ.get('PRELOAD_IMPORTS', default=0))
+
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'roi_calculator.middleware.AsyncWhiteNoiseMiddleware',
+    'roi_calculator.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,7 +104,7 @@ WSGI_APPLICATION = 'StockValuation.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', default=BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -140,6 +152,12 @@ STATICFILES_DIRS = (
     # This defines a prefix so the url paths will become `/static/node_modules/...`
     ('node_modules', os.path.join(BASE_DIR, 'node_modules/')),
 )
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    # plotly.js from the plotly package, for the 'static' chart mode
+    'roi_calculator.finders.PlotlyFinder',
+]
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -147,3 +165,108 @@ STATICFILES_DIRS = (
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 X_FRAME_OPTIONS = 'SAMEORIGIN'
+
+# Cached fundamentals - (time to live, stale-while-revalidate window) in seconds per field class.
+# 'quote' values come from ticker.info only, 'statements' need the full financial statements.
+VALUATION_CACHE_TTL = {
+    'quote': (15 * 60, 60 * 60),
+    'statements': (24 * 60 * 60, 7 * 24 * 60 * 60),
+}
+
+# Upstream fetching - threads per worker process, seconds allowed per call and per whole snapshot
+UPSTREAM_MAX_WORKERS = int(os.environ.get('UPSTREAM_MAX_WORKERS', default=8))
+UPSTREAM_CALL_TIMEOUT = float(os.environ.get('UPSTREAM_CALL_TIMEOUT', default=10))
+UPSTREAM_DEADLINE = float(os.environ.get('UPSTREAM_DEADLINE', default=15))
+# Yahoo calls per second and burst size (0 disables the limit), per process unless
+# UPSTREAM_RATE_LIMIT_FILE names a file shared by the worker processes
+UPSTREAM_RATE = float(os.environ.get('UPSTREAM_RATE', default=5))
+UPSTREAM_BURST = int(os.environ.get('UPSTREAM_BURST', default=10))
+UPSTREAM_RATE_LIMIT_FILE = os.environ.get('UPSTREAM_RATE_LIMIT_FILE', default='')
+# Transient failures are retried with jittered exponential backoff starting at UPSTREAM_BACKOFF
+# seconds, after UPSTREAM_BREAKER_THRESHOLD failed calls in a row the upstream is left alone
+# for UPSTREAM_BREAKER_COOLDOWN seconds and the cached values are served
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', default=2))
+UPSTREAM_BACKOFF = float(os.environ.get('UPSTREAM_BACKOFF', default=0.5))
+UPSTREAM_BREAKER_THRESHOLD = int(os.environ.get('UPSTREAM_BREAKER_THRESHOLD', default=5))
+UPSTREAM_BREAKER_COOLDOWN = float(os.environ.get('UPSTREAM_BREAKER_COOLDOWN', default=30))
+
+# Shared by the worker processes, holds e.g. the chart data
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'valuatio-cache')),
+    }
+}
+
+# 'static' - the page loads plotly.js as a static file and the OHLC data from chart.json,
+# 'inline' - the whole plotly figure (including plotly.js) is rendered into the page
+CHART_MODE = os.environ.get('CHART_MODE', default='inline')
+CHART_CACHE_TIMEOUT = 15 * 60
+
+# Concurrent lookups of one symbol share a single upstream fetch, worker processes coordinate
+# through lock files in SINGLE_FLIGHT_LOCK_DIR and wait at most SINGLE_FLIGHT_TIMEOUT seconds
+SINGLE_FLIGHT_LOCK_DIR = os.environ.get(
+    'SINGLE_FLIGHT_LOCK_DIR', default=os.path.join(tempfile.gettempdir(), 'valuatio-locks'))
+SINGLE_FLIGHT_TIMEOUT = UPSTREAM_DEADLINE + 5
+
+# Daily price history of the yfinance data source, stored per symbol and topped up with the
+# bars since the last stored day instead of downloading five years again, disabled when empty
+PRICE_STORE_DIR = os.environ.get('PRICE_STORE_DIR', default=os.path.join(tempfile.gettempdir(), 'valuatio-prices'))
+
+# Directory for the opt-in raw data archive (gzipped CSV per symbol and day), disabled when empty
+RAW_ARCHIVE_DIR = os.environ.get('RAW_ARCHIVE_DIR', default='')
+
+# 'yfinance', 'fixtures' (snapshots recorded into FIXTURE_DIR by `manage.py record_fixtures`, for
+# reproducible benchmarks) or 'stub' (synthetic data answering after STUB_LATENCY seconds, for load tests)
+VALUATION_DATA_SOURCE = os.environ.get('VALUATION_DATA_SOURCE', default='yfinance')
+FIXTURE_DIR = os.environ.get('FIXTURE_DIR', default=BASE_DIR / 'fixtures')
+STUB_LATENCY = float(os.environ.get('STUB_LATENCY', default=0.5))
+
+# Scenarios of the projection behind the expected yearly return percentiles on the ticker page
+PROJECTION_SCENARIOS = int(os.environ.get('PROJECTION_SCENARIOS', default=10000))
+
+# Serve ticker pages with the async view, use together with an ASGI server (StockValuation.asgi)
+ASYNC_VIEWS = int(os.environ.get('ASYNC_VIEWS', default=0))
+
+# Without the statements in the DB, serve the page shell from ticker.info right away
+# and let the browser fetch the fundamentals, scoring and long term sections as fragments
+PROGRESSIVE_RENDERING = int(os.environ.get('PROGRESSIVE_RENDERING', default=0))
+
+# Screener - symbols valued at once per request (or per `manage.py screen` run) and symbols per request
+SCREENER_MAX_WORKERS = int(os.environ.get('SCREENER_MAX_WORKERS', default=8))
+SCREENER_MAX_SYMBOLS = int(os.environ.get('SCREENER_MAX_SYMBOLS', default=500))
+
+# JSON API - symbols per /api/v1/valuations request, the whole response is built in memory
+# unlike the streamed screener, the symbols are valued by SCREENER_MAX_WORKERS threads
+API_MAX_SYMBOLS = int(os.environ.get('API_MAX_SYMBOLS', default=50))
+
+# 'absolute' scores every metric against the benchmarks in scoring.ini, 'relative' against the
+# cached tickers of the same sector and country (or sector, or all of them) when there are at
+# least RELATIVE_MIN_PEERS. Each process picks up other processes' refreshes every
+# RELATIVE_SYNC_INTERVAL seconds.
+SCORING_MODE = os.environ.get('SCORING_MODE', default='absolute')
+RELATIVE_MIN_PEERS = int(os.environ.get('RELATIVE_MIN_PEERS', default=10))
+RELATIVE_SYNC_INTERVAL = float(os.environ.get('RELATIVE_SYNC_INTERVAL', default=60))
+
+# Symbols the upstream data is not enough to value are not tried again for NEGATIVE_CACHE_TTL
+# seconds, doubled with every further failure up to NEGATIVE_CACHE_MAX_TTL
+NEGATIVE_CACHE_TTL = int(os.environ.get('NEGATIVE_CACHE_TTL', default=60 * 60))
+NEGATIVE_CACHE_MAX_TTL = int(os.environ.get('NEGATIVE_CACHE_MAX_TTL', default=7 * 24 * 60 * 60))
+
+# Symbols and names of the listed stocks (`manage.py update_symbols`) for the search autocomplete
+# and the ticker validation, both are off when the file does not exist
+SYMBOL_LISTING_FILE = os.environ.get('SYMBOL_LISTING_FILE', default=BASE_DIR / 'roi_calculator' / 'values' / 'symbols.csv')
+
+# Pre-warming - `manage.py scheduler` refreshes the tracked symbols (added with `manage.py prewarm`
+# or listed in PREWARM_UNIVERSE_FILE) every PREWARM_INTERVAL seconds before they go stale, with
+# PREWARM_WORKERS threads. A claimed symbol is given up after PREWARM_LEASE seconds.
+PREWARM_UNIVERSE_FILE = os.environ.get('PREWARM_UNIVERSE_FILE', default='')
+PREWARM_INTERVAL = float(os.environ.get('PREWARM_INTERVAL', default=60))
+PREWARM_WORKERS = int(os.environ.get('PREWARM_WORKERS', default=4))
+PREWARM_LEASE = float(os.environ.get('PREWARM_LEASE', default=5 * 60))
+# Lookups of tracked symbols are counted in memory and written every PREWARM_HITS_FLUSH seconds
+PREWARM_HITS_FLUSH = float(os.environ.get('PREWARM_HITS_FLUSH', default=60))
+
+# Server-Timing headers and the Prometheus metrics at /metrics (per worker process). Off by
+# default, /metrics has no access control and is meant for an internal scraper.
+METRICS_ENABLED = int(os.environ.get('METRICS_ENABLED', default=0))
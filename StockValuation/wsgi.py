@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StockValuation.settings')
 
 application = get_wsgi_application()
+
+if settings.PRELOAD_IMPORTS:
+    from roi_calculator.startup import preload
+    preload()
@@ -1,3 +1,20 @@
 from django.contrib import admin
+from .models import CachedFundamentals, FailedSymbol, RefreshJob
 
-# Register your models here.
+
+@admin.register(CachedFundamentals)
+class CachedFundamentalsAdmin(admin.ModelAdmin):
+    list_display = ('symbol', 'data_saved_on', 'statements_saved_on')
+    search_fields = ('symbol',)
+
+
+@admin.register(RefreshJob)
+class RefreshJobAdmin(admin.ModelAdmin):
+    list_display = ('symbol', 'hits', 'last_run_on', 'failures', 'not_before')
+    search_fields = ('symbol',)
+
+
+@admin.register(FailedSymbol)
+class FailedSymbolAdmin(admin.ModelAdmin):
+    list_display = ('symbol', 'reason', 'failures', 'failed_on', 'retry_after')
+    search_fields = ('symbol',)
@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .cache import get_fundamentals, json_compatible
+from .projection import return_bands
+from .screener import screen
+from .utils import seven_yrs_overview, return_on_investment, stock_overall_score, stock_scoring
+
+VERSION = 1
+# the rows of seven_yrs_overview, one list of the seven years each
+OVERVIEW = ('tse_per_share', 'earnings_per_share', 'dividend_per_share')
+
+
+def overview_section(fundamentals):
+    overview = seven_yrs_overview(fundamentals)
+    return {name: [overview[year][i] for year in sorted(overview, key=int)] for i, name in enumerate(OVERVIEW)}
+
+
+def roi_section(fundamentals):
+    return return_on_investment(fundamentals, seven_yrs_overview(fundamentals))
+
+
+def score_section(fundamentals):
+    # the score of every metric, without the css class and weight of the page
+    return {metric: score[0][0] for metric, score in stock_scoring(fundamentals).items()}
+
+
+def overall_score_section(fundamentals):
+    overall_score = stock_overall_score(stock_scoring(fundamentals))
+    return overall_score[0] if overall_score else None
+
+
+# computed from the fundamentals, only when selected
+SECTIONS = {
+    'overview': overview_section,
+    'roi': roi_section,
+    'return_bands': return_bands,
+    'score': score_section,
+    'overall_score': overall_score_section,
+}
+
+
+def parse_fields(text):
+    return {field.strip() for field in text.split(',') if field.strip()}
+
+
+def valuation(symbol, fields=None, exclude=()):
+    """The fundamentals of the ticker page plus the computed sections, as one flat object.
+
+    ``fields`` limits it to the named keys, ``exclude`` drops keys, e.g. the long description.
+    Sections are only computed when they are part of the result.
+    """
+    def selected(name):
+        return (fields is None or name in fields) and name not in exclude
+
+    fundamentals = get_fundamentals(symbol)
+    result = {'symbol': fundamentals['symbol'], 'data_saved_on': fundamentals.get('data_saved_on')}
+    result.update((key, value) for key, value in json_compatible(fundamentals).items() if selected(key))
+    result.update((name, section(fundamentals)) for name, section in SECTIONS.items() if selected(name))
+    return compact(result)
+
+
+def valuations(symbols, fields=None, exclude=()):
+    # in the order of `symbols`, a symbol which cannot be valued gets an error instead
+    def value(symbol):
+        try:
+            return symbol, valuation(symbol, fields, exclude)
+        except Exception as e:
+            return symbol, {'symbol': symbol, 'error': f'{type(e).__name__}: {e}'}
+        finally:
+            connection.close()
+
+    results = dict(screen(symbols, settings.SCREENER_MAX_WORKERS, value))
+    return [results[symbol] for symbol in symbols]
+
+
+def compact(value):
+    # JSON compatible values all the way down, NaN and inf become null
+    if isinstance(value, dict):
+        return {key: compact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [compact(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class Roi_calculatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'roi_calculator'
+
+    def ready(self):
+        from .scoring import get_scoring_model
+        get_scoring_model()
@@ -0,0 +1,111 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+
+from .snapshot import DATASETS, TickerSnapshot
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS = ('balancesheet', 'quarterly_balancesheet', 'financials', 'quarterly_financials', 'quarterly_cashflow')
+
+_queue = queue.Queue(maxsize=100)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def archive_snapshot(snapshot):
+    # Opt-in (RAW_ARCHIVE_DIR) raw data archive. The snapshot is only queued here, a background
+    # thread writes it to RAW_ARCHIVE_DIR/<symbol>/<date>/ as gzipped CSV and JSON files.
+    if not settings.RAW_ARCHIVE_DIR:
+        return
+    start_writer()
+    try:
+        _queue.put_nowait((Path(settings.RAW_ARCHIVE_DIR), date.today(), snapshot))
+    except queue.Full:
+        logger.warning('raw data archive queue is full, %s not archived', snapshot.symbol)
+
+
+def start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_forever, name='raw-archive', daemon=True)
+            _writer.start()
+
+
+def flush():
+    # blocks until every queued snapshot is written
+    _queue.join()
+
+
+def _write_forever():
+    while True:
+        archive_dir, day, snapshot = _queue.get()
+        try:
+            write_snapshot(snapshot_dir(archive_dir, snapshot.symbol, day), snapshot)
+        except Exception:
+            logger.exception('archiving %s failed', snapshot.symbol)
+        finally:
+            _queue.task_done()
+
+
+def snapshot_dir(archive_dir, symbol, day):
+    return Path(archive_dir) / symbol / day.isoformat()
+
+
+def write_snapshot(directory, snapshot):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in DATASETS:
+        data = getattr(snapshot, name)
+        if data is None:
+            continue
+        if name == 'info':
+            path = directory / 'info.json.gz'
+            _replace(path, lambda tmp: _write_json(tmp, data))
+        else:
+            path = directory / f'{name}.csv.gz'
+            _replace(path, lambda tmp: data.to_csv(tmp, compression='gzip'))
+
+
+def read_snapshot(directory, symbol=None):
+    # replays an archived snapshot, missing datasets are None
+    directory = Path(directory)
+    datasets = {}
+    for name in DATASETS:
+        path = directory / ('info.json.gz' if name == 'info' else f'{name}.csv.gz')
+        datasets[name] = _read_dataset(name, path) if path.exists() else None
+    return TickerSnapshot(symbol=symbol or directory.parent.name, **datasets)
+
+
+def _read_dataset(name, path):
+    if name == 'info':
+        with gzip.open(path, 'rt') as file:
+            return json.load(file)
+    if name in STATEMENTS:
+        frame = pd.read_csv(path, index_col=0, float_precision='round_trip')
+        frame.columns = pd.to_datetime(frame.columns)
+        return frame
+    if name in ('history', 'dividends'):
+        frame = pd.read_csv(path, index_col=0, parse_dates=True, float_precision='round_trip')
+        return frame['Dividends'] if name == 'dividends' else frame
+    return pd.read_csv(path, index_col=0, float_precision='round_trip')
+
+
+def _write_json(path, data):
+    with gzip.open(path, 'wt') as file:
+        json.dump(data, file, default=str)
+
+
+def _replace(path, write):
+    # several workers may archive the same symbol on the same day
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}')
+    write(tmp)
+    os.replace(tmp, path)
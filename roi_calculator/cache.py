@@ -0,0 +1,284 @@
+import math
+import threading
+from datetime import timedelta
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+from . import singleflight
+from .archive import archive_snapshot
+from .charts import store_chart
+from .failures import CannotValue, check_failed, check_info, clear_failure, record_failure, records_failures
+from .metrics import increment, span
+from .models import CachedFundamentals
+from .popularity import count_hit
+from .providers import upstream_ticker
+from .relative import update_index
+from .snapshot import TickerSnapshot, run_upstream, upstream_call
+from .upstream import UpstreamError, set_timeout
+from .utils import basic_info_dictionary, valuation_dictionary, quote_dictionary
+
+FRESH = 'fresh'
+STALE = 'stale'
+EXPIRED = 'expired'
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def get_fundamentals(symbol):
+    return load(symbol)[0]
+
+
+def load(symbol):
+    # Serve fundamentals from the DB. Stale entries are served right away and refreshed
+    # in a background thread, expired (or missing) entries are refreshed synchronously.
+    # Returns (fundamentals, snapshot), snapshot is only set when the statements were downloaded.
+    symbol = symbol.upper()
+    entry, refresh = lookup(symbol)
+    if refresh is not None:
+        # concurrent requests for the symbol share one refresh, across worker processes too
+        try:
+            check_failed(symbol)
+            return singleflight.do(flight_key(symbol), lambda: refresh(symbol), lambda: refreshed(symbol))
+        except (UpstreamError, CannotValue):
+            # Throttled, down, circuit open or the data is incomplete right now: the last cached
+            # values are better than an error page.
+            if entry is None:
+                raise
+            increment('valuatio_cache_lookups_total', cache='fundamentals', result='served_expired')
+    return fundamentals_from_entry(entry), None
+
+
+async def aload(symbol):
+    # same as load(), but the upstream calls are awaited instead of blocking the worker
+    symbol = symbol.upper()
+    entry, refresh = await sync_to_async(lookup)(symbol)
+    if refresh is None:
+        return fundamentals_from_entry(entry), None
+
+    async def arefresh():
+        try:
+            if refresh is refresh_fundamentals:
+                snapshot = await TickerSnapshot.afetch(upstream_ticker(symbol))
+                archive_snapshot(snapshot)
+                await sync_to_async(store_chart)(snapshot)
+                fundamentals = await sync_to_async(valuate, thread_sensitive=False)(snapshot)
+                return await sync_to_async(store_fundamentals)(symbol, fundamentals), snapshot
+            info = await run_upstream(f'{symbol}: info', fetch_info, symbol)
+            return await sync_to_async(store_quote)(symbol, info), None
+        except CannotValue as e:
+            await sync_to_async(record_failure)(symbol, e.reason)
+            raise
+
+    try:
+        await sync_to_async(check_failed)(symbol)
+        return await singleflight.ado(flight_key(symbol), arefresh, sync_to_async(lambda: refreshed(symbol)))
+    except (UpstreamError, CannotValue):
+        if entry is None:
+            raise
+        increment('valuatio_cache_lookups_total', cache='fundamentals', result='served_expired')
+        return fundamentals_from_entry(entry), None
+
+
+def needs_statements(symbol):
+    # whether serving the symbol has to wait for the financial statements to download, no side
+    # effects: the lookup is counted by load() or load_basic_info(), whichever serves the request
+    entry = CachedFundamentals.objects.filter(symbol=symbol.upper()).only('statements_saved_on').first()
+    return entry is None or freshness(timezone.now() - entry.statements_saved_on, 'statements') == EXPIRED
+
+
+def load_basic_info(symbol):
+    # Only ticker.info for the page shell. The full refresh starts in the background first,
+    # so the sections requested by the shell join its flight instead of starting their own.
+    symbol = symbol.upper()
+    check_failed(symbol)
+    # counts the request, the statements are refreshed below whatever state the entry is in
+    lookup(symbol)
+    refresh_in_background(symbol, refresh_fundamentals)
+    info = fetch_info(symbol)
+    return basic_info_dictionary(info)
+
+
+async def aload_basic_info(symbol):
+    symbol = symbol.upper()
+    await sync_to_async(check_failed)(symbol)
+    await sync_to_async(lookup)(symbol)
+    refresh_in_background(symbol, refresh_fundamentals)
+    info = await run_upstream(f'{symbol}: info', fetch_info, symbol)
+    return basic_info_dictionary(info)
+
+
+def lookup(symbol):
+    # Returns the cached entry and the refresh which has to run before it can be served,
+    # refreshes which can run after serving the entry are started in the background.
+    entry = CachedFundamentals.objects.filter(symbol=symbol).first()
+    # popularity of the pre-warmed symbols, nothing is written here
+    count_hit(symbol)
+    if entry is None:
+        increment('valuatio_cache_lookups_total', cache='fundamentals', result='miss')
+        return None, refresh_fundamentals
+    now = timezone.now()
+    statements = freshness(now - entry.statements_saved_on, 'statements')
+    quote = freshness(now - entry.data_saved_on, 'quote')
+    if statements == EXPIRED:
+        increment('valuatio_cache_lookups_total', cache='fundamentals', result='expired')
+        return entry, refresh_fundamentals
+    if statements == STALE:
+        increment('valuatio_cache_lookups_total', cache='fundamentals', result='stale')
+        refresh_in_background(symbol, refresh_fundamentals)
+    elif quote == EXPIRED:
+        increment('valuatio_cache_lookups_total', cache='fundamentals', result='quote_expired')
+        return entry, refresh_quote
+    elif quote == STALE:
+        increment('valuatio_cache_lookups_total', cache='fundamentals', result='stale')
+        refresh_in_background(symbol, refresh_quote)
+    else:
+        increment('valuatio_cache_lookups_total', cache='fundamentals', result='hit')
+    return entry, None
+
+
+def cached_version(symbol):
+    # (data_saved_on, refresh) of the entry when it can be served without refreshing it first,
+    # refresh is the one a stale entry needs in the background. No side effects.
+    entry = CachedFundamentals.objects.filter(symbol=symbol.upper()).only(
+        'data_saved_on', 'statements_saved_on').first()
+    if entry is None:
+        return None
+    now = timezone.now()
+    statements = freshness(now - entry.statements_saved_on, 'statements')
+    quote = freshness(now - entry.data_saved_on, 'quote')
+    if EXPIRED in (statements, quote):
+        return None
+    if statements == STALE:
+        return entry.data_saved_on, refresh_fundamentals
+    return entry.data_saved_on, refresh_quote if quote == STALE else None
+
+
+def refreshed(symbol):
+    # the entry when another worker refreshed it while this one waited for the flight lock
+    entry = CachedFundamentals.objects.filter(symbol=symbol).first()
+    if entry is None:
+        return None
+    now = timezone.now()
+    if freshness(now - entry.statements_saved_on, 'statements') != FRESH:
+        return None
+    if freshness(now - entry.data_saved_on, 'quote') != FRESH:
+        return None
+    return fundamentals_from_entry(entry), None
+
+
+def flight_key(symbol):
+    return f'fundamentals-{symbol}'
+
+
+def freshness(age, field_class):
+    ttl, stale_while_revalidate = settings.VALUATION_CACHE_TTL[field_class]
+    if age <= timedelta(seconds=ttl):
+        return FRESH
+    if age <= timedelta(seconds=ttl + stale_while_revalidate):
+        return STALE
+    return EXPIRED
+
+
+@records_failures
+def refresh_fundamentals(symbol):
+    snapshot = TickerSnapshot.fetch(upstream_ticker(symbol))
+    archive_snapshot(snapshot)
+    store_chart(snapshot)
+    return store_fundamentals(symbol, valuate(snapshot)), snapshot
+
+
+@records_failures
+def refresh_quote(symbol):
+    # only ticker.info is downloaded, values computed from the statements are kept
+    info = fetch_info(symbol)
+    return store_quote(symbol, info), None
+
+
+@upstream_call('info')
+def fetch_info(symbol):
+    # checked inside the upstream call, so an empty answer is retried
+    ticker = upstream_ticker(symbol)
+    set_timeout(ticker, settings.UPSTREAM_CALL_TIMEOUT)
+    info = ticker.info
+    check_info(symbol, info)
+    return info
+
+
+def valuate(snapshot):
+    # what the completeness checks do not catch fails here, after all the downloads
+    with span('valuation'):
+        try:
+            return valuation_dictionary(snapshot)
+        except (LookupError, ArithmeticError, TypeError, ValueError) as e:
+            raise CannotValue(snapshot.symbol, f'{type(e).__name__}: {e}') from e
+
+
+def store_fundamentals(symbol, fundamentals):
+    now = timezone.now()
+    entry = CachedFundamentals(symbol=symbol, fundamentals=json_compatible(fundamentals),
+                               data_saved_on=now, statements_saved_on=now)
+    # Single statement writes instead of update_or_create: SQLite cannot upgrade the read lock
+    # of its transaction while another worker writes and fails with "database is locked".
+    values = {'fundamentals': entry.fundamentals, 'data_saved_on': now, 'statements_saved_on': now}
+    if not CachedFundamentals.objects.filter(symbol=symbol).update(**values):
+        try:
+            entry.save(force_insert=True)
+        except IntegrityError:
+            CachedFundamentals.objects.filter(symbol=symbol).update(**values)
+    update_index(symbol, entry.fundamentals)
+    clear_failure(symbol)
+    return fundamentals_from_entry(entry)
+
+
+def store_quote(symbol, info):
+    entry = CachedFundamentals.objects.get(symbol=symbol)
+    entry.fundamentals.update(json_compatible(quote_dictionary(info, entry.fundamentals['eps'])))
+    entry.data_saved_on = timezone.now()
+    entry.save(update_fields=['fundamentals', 'data_saved_on'])
+    update_index(symbol, entry.fundamentals)
+    return fundamentals_from_entry(entry)
+
+
+def refresh_in_background(symbol, refresh):
+    with _refreshing_lock:
+        if symbol in _refreshing:
+            return
+        _refreshing.add(symbol)
+    threading.Thread(target=_run_refresh, args=(symbol, refresh), daemon=True).start()
+
+
+def _run_refresh(symbol, refresh):
+    try:
+        singleflight.do(flight_key(symbol), lambda: refresh(symbol), lambda: refreshed(symbol))
+    except Exception:
+        # the stale entry keeps being served, next request will try again
+        pass
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(symbol)
+        connection.close()
+
+
+def fundamentals_from_entry(entry):
+    fundamentals = dict(entry.fundamentals)
+    fundamentals['data_saved_on'] = entry.data_saved_on
+    return fundamentals
+
+
+def json_compatible(fundamentals):
+    # numpy scalars and NaN/inf are not valid JSON
+    compatible = {}
+    for key, value in fundamentals.items():
+        if key == 'data_saved_on':
+            continue
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and not math.isfinite(value):
+            value = None
+        compatible[key] = value
+    return compatible
@@ -0,0 +1,70 @@
+from datetime import date
+from importlib.metadata import version
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from . import singleflight
+from .metrics import increment
+from .providers import upstream_ticker
+from .snapshot import checked_history, run_upstream, upstream_call
+
+CHART_PERIOD = '3mo'
+# appended to the plotly.js url, so browsers can keep it until plotly is upgraded
+PLOTLY_VERSION = version('plotly')
+
+
+def chart_payload(price_history):
+    # compact OHLC data the page draws the candlestick from
+    return {
+        'x': price_history.index.strftime('%Y-%m-%d').tolist(),
+        'open': price_history['Open'].round(4).tolist(),
+        'high': price_history['High'].round(4).tolist(),
+        'low': price_history['Low'].round(4).tolist(),
+        'close': price_history['Close'].round(4).tolist(),
+    }
+
+
+def chart_key(symbol):
+    return f'chart-{symbol.upper()}-{date.today().isoformat()}'
+
+
+def store_chart(snapshot):
+    # the snapshot already holds the chart history, so the page's chart request is a cache hit
+    caches['default'].set(chart_key(snapshot.symbol), chart_payload(snapshot.chart_history()),
+                          settings.CHART_CACHE_TIMEOUT)
+
+
+def get_chart(symbol):
+    payload = caches['default'].get(chart_key(symbol))
+    increment('valuatio_cache_lookups_total', cache='chart', result='miss' if payload is None else 'hit')
+    if payload is None:
+        payload = chart_payload(chart_history(symbol))
+        caches['default'].set(chart_key(symbol), payload, settings.CHART_CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_chart(symbol):
+    payload = await sync_to_async(caches['default'].get)(chart_key(symbol))
+    increment('valuatio_cache_lookups_total', cache='chart', result='miss' if payload is None else 'hit')
+    if payload is None:
+        payload = chart_payload(await achart_history(symbol))
+        await sync_to_async(caches['default'].set)(chart_key(symbol), payload, settings.CHART_CACHE_TIMEOUT)
+    return payload
+
+
+def chart_history(symbol):
+    symbol = symbol.upper()
+    return singleflight.do(f'history-{symbol}', lambda: fetch_chart_history(symbol))
+
+
+async def achart_history(symbol):
+    symbol = symbol.upper()
+    return await singleflight.ado(
+        f'history-{symbol}', lambda: run_upstream(f'{symbol}: history', fetch_chart_history, symbol))
+
+
+@upstream_call('chart_history')
+def fetch_chart_history(symbol):
+    return checked_history(symbol, upstream_ticker(symbol).history(period=CHART_PERIOD, interval='1d'))
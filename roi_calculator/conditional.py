@@ -0,0 +1,66 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import cached_version, refresh_in_background
+from .relative import scoring_version
+
+
+def validators(symbol):
+    # (etag, last modified, background refresh) of the cached valuation, None when it has to be
+    # refreshed before serving
+    version = cached_version(symbol)
+    if version is None:
+        return None
+    saved_on, refresh = version
+    # the scores on the page depend on scoring.ini (and the peers when scored relatively) as well
+    etag = quote_etag(f'{symbol.upper()}-{saved_on.timestamp():.6f}-{scoring_version()}')
+    return etag, saved_on, refresh
+
+
+def not_modified(request, symbol, version):
+    if version is None or request.method not in ('GET', 'HEAD'):
+        return None
+    etag, saved_on, refresh = version
+    response = get_conditional_response(request, etag=etag, last_modified=int(saved_on.timestamp()))
+    if response is not None and refresh is not None:
+        # the view does not run, a stale entry has to be revalidated from here
+        refresh_in_background(symbol.upper(), refresh)
+    return response
+
+
+def add_validators(request, response, version):
+    # Shared caches may serve the page for as long as the quote on it is fresh. Not a page with
+    # a CSRF token though, the token and its cookie are different for every visitor.
+    if version is None or request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304) or \
+            request.META.get('CSRF_COOKIE_USED'):
+        return response
+    etag, saved_on, _ = version
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(saved_on.timestamp())
+    age = (timezone.now() - saved_on).total_seconds()
+    patch_cache_control(response, public=True, max_age=max(0, int(settings.VALUATION_CACHE_TTL['quote'][0] - age)))
+    return response
+
+
+def conditional_ticker(view):
+    """Answers conditional requests for a ticker with 304 before its valuation is loaded or rendered."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, ticker, *args, **kwargs):
+            version = await sync_to_async(validators)(ticker)
+            response = not_modified(request, ticker, version) or await view(request, ticker, *args, **kwargs)
+            return add_validators(request, response, version)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, ticker, *args, **kwargs):
+        version = validators(ticker)
+        response = not_modified(request, ticker, version) or view(request, ticker, *args, **kwargs)
+        return add_validators(request, response, version)
+    return wrapper
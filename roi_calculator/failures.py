@@ -0,0 +1,91 @@
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import FailedSymbol
+from .upstream import EmptyResponse
+
+# ticker.info values the valuation cannot do without, the others may be missing
+REQUIRED_INFO = ('symbol', 'regularMarketPrice', 'sharesOutstanding', 'marketCap', 'currency')
+# (dataset, row of the statement) which have to be there
+REQUIRED_ROWS = (
+    ('balancesheet', 'Total Stockholder Equity'),
+    ('quarterly_balancesheet', 'Total Stockholder Equity'),
+)
+# (dataset, column) which have to hold values
+REQUIRED_COLUMNS = (
+    ('earnings', 'Earnings'),
+    ('quarterly_earnings', 'Earnings'),
+)
+
+
+class CannotValue(Exception):
+    """The upstream data of the symbol is not enough for a valuation, trying again right away will not help."""
+
+    def __init__(self, symbol, reason):
+        super().__init__(f'{symbol}: {reason}')
+        self.symbol = symbol
+        self.reason = reason
+
+
+def is_empty_quote(info):
+    # what yfinance 0.1.70 makes of a throttled or failed download: {} or {'regularMarketPrice': None}
+    # a quote which exists always names its symbol or type
+    return not info.get('symbol') and not info.get('quoteType')
+
+
+def check_info(symbol, info):
+    # before the statements are downloaded: an empty quote is retried, an incomplete one cannot be valued
+    if is_empty_quote(info):
+        raise EmptyResponse(f'{symbol}: no quote data')
+    missing = [key for key in REQUIRED_INFO if info.get(key) is None]
+    if missing:
+        raise CannotValue(symbol, f"no {', '.join(missing)} in the quote data")
+
+
+def check_statements(symbol, datasets):
+    missing = [f'{row} ({name})' for name, row in REQUIRED_ROWS if row not in datasets[name].index]
+    missing += [f'{column} ({name})' for name, column in REQUIRED_COLUMNS
+                if column not in datasets[name] or datasets[name][column].dropna().empty]
+    if missing:
+        raise CannotValue(symbol, f"no {', '.join(missing)} in the financial statements")
+
+
+def check_failed(symbol):
+    # raises CannotValue while the last failure of the symbol is recent
+    failed = FailedSymbol.objects.filter(symbol=symbol, retry_after__gt=timezone.now()).first()
+    if failed is not None:
+        raise CannotValue(symbol, failed.reason)
+
+
+def record_failure(symbol, reason):
+    failed = FailedSymbol.objects.filter(symbol=symbol).first()
+    failures = failed.failures + 1 if failed is not None else 1
+    ttl = min(settings.NEGATIVE_CACHE_TTL * 2 ** min(failures - 1, 16), settings.NEGATIVE_CACHE_MAX_TTL)
+    now = timezone.now()
+    values = {'reason': reason, 'failures': failures, 'failed_on': now, 'retry_after': now + timedelta(seconds=ttl)}
+    # single statement writes, see store_fundamentals
+    if not FailedSymbol.objects.filter(symbol=symbol).update(**values):
+        try:
+            FailedSymbol.objects.create(symbol=symbol, **values)
+        except IntegrityError:
+            FailedSymbol.objects.filter(symbol=symbol).update(**values)
+
+
+def clear_failure(symbol):
+    FailedSymbol.objects.filter(symbol=symbol).delete()
+
+
+def records_failures(refresh):
+    # a refresh failing with CannotValue puts the symbol into the negative cache
+    @wraps(refresh)
+    def recorded(symbol):
+        try:
+            return refresh(symbol)
+        except CannotValue as e:
+            record_failure(symbol, e.reason)
+            raise
+    return recorded
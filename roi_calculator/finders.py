@@ -0,0 +1,26 @@
+import importlib.util
+import os
+
+from django.contrib.staticfiles.finders import BaseFinder
+from django.core.files.storage import FileSystemStorage
+
+PLOTLY_JS = 'plotly/plotly.min.js'
+
+
+class PlotlyFinder(BaseFinder):
+    """Serves plotly.min.js of the installed plotly package as static/plotly/plotly.min.js."""
+
+    def __init__(self, *args, **kwargs):
+        # located without importing plotly
+        package = importlib.util.find_spec('plotly').submodule_search_locations[0]
+        self.storage = FileSystemStorage(location=os.path.join(package, 'package_data'))
+        self.storage.prefix = os.path.dirname(PLOTLY_JS)
+
+    def find(self, path, all=False):
+        if path != PLOTLY_JS:
+            return []
+        match = self.storage.path(os.path.basename(PLOTLY_JS))
+        return [match] if all else match
+
+    def list(self, ignore_patterns):
+        yield os.path.basename(PLOTLY_JS), self.storage
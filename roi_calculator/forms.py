@@ -1,11 +1,29 @@
 from django import forms
 
+from .symbols import get_symbol_index, is_checkable
 
-class TickerForm(forms.Form):
+
+class ListedTickerMixin:
+    # unknown symbols are rejected before anything is downloaded for them
+    def clean_ticker(self):
+        ticker = self.cleaned_data['ticker'].upper().strip()
+        index = get_symbol_index()
+        if index is not None and is_checkable(ticker) and ticker not in index:
+            suggestions = index.suggest(ticker)
+            message = f'{ticker} is not a listed symbol.'
+            if suggestions:
+                message += f" Did you mean {', '.join(suggestions)}?"
+            raise forms.ValidationError(message)
+        return ticker
+
+
+class TickerForm(ListedTickerMixin, forms.Form):
     ticker = forms.CharField(label="", max_length=6, widget=forms.TextInput(
-        attrs={'class': 'drac-input drac-input-lg drac-input-green drac-text-green drac-m-xs center'}))
+        attrs={'class': 'drac-input drac-input-lg drac-input-green drac-text-green drac-m-xs center',
+               'list': 'symbol-suggestions', 'autocomplete': 'off'}))
 
 
-class TickerFormSmall(forms.Form):
+class TickerFormSmall(ListedTickerMixin, forms.Form):
     ticker = forms.CharField(label="", max_length=6, widget=forms.TextInput(
-        attrs={'placeholder': "Ticker:", 'class': 'drac-input drac-input-green drac-text-green drac-m-xs'}))
+        attrs={'placeholder': "Ticker:", 'class': 'drac-input drac-input-green drac-text-green drac-m-xs',
+               'list': 'symbol-suggestions', 'autocomplete': 'off'}))
@@ -0,0 +1,146 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from roi_calculator.providers import get_provider
+from roi_calculator.snapshot import TickerSnapshot
+from roi_calculator.utils import (
+    altman_z_score, candlestick, piotroski_f_score, return_on_investment, seven_yrs_overview, stock_scoring,
+    valuation_dictionary)
+
+SYMBOLS = ('AAPL', 'MSFT', 'KO', 'JNJ', 'NVDA')
+
+
+class Command(BaseCommand):
+    help = ('Times the valuation, scoring and rendering stages on stub or recorded data, '
+            'optionally saves the results as JSON and compares them with a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', default=SYMBOLS)
+        parser.add_argument('--source', choices=('stub', 'fixtures'), default='stub',
+                            help="'fixtures' replays the snapshots recorded by record_fixtures")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='a stage more than this fraction slower than the baseline is a regression')
+
+    def handle(self, *args, **options):
+        symbols = [symbol.upper() for symbol in options['symbols']]
+        data_source = override_settings(VALUATION_DATA_SOURCE=options['source'], STUB_LATENCY=0,
+                                        PROGRESSIVE_RENDERING=0, RAW_ARCHIVE_DIR='')
+        with data_source:
+            provider = get_provider()
+            snapshots = [TickerSnapshot.fetch(provider.ticker(symbol)) for symbol in symbols]
+            fundamentals = [valuation_dictionary(snapshot) for snapshot in snapshots]
+            stages = {
+                'valuation_dictionary': (valuation_dictionary, snapshots),
+                'piotroski_f_score': (piotroski_f_score, snapshots),
+                'altman_z_score': (altman_z_score, snapshots),
+                'stock_scoring': (stock_scoring, fundamentals),
+                'overview_roi': (lambda f: return_on_investment(f, seven_yrs_overview(f)), fundamentals),
+                'candlestick': (lambda s: candlestick(s.chart_history()), snapshots),
+            }
+            results = {name: measure(func, items, options['repeat']) for name, (func, items) in stages.items()}
+            results.update(self.measure_views(symbols, options['repeat']))
+
+        report = {'meta': environment(symbols, options), 'stages': results}
+        self.print_report(results, load_baseline(options['baseline']), options['threshold'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['baseline'] and self.regressions:
+            raise CommandError(f"slower than the baseline: {', '.join(self.regressions)}")
+
+    def measure_views(self, symbols, repeat):
+        # full requests through the test client against a throwaway test database,
+        # the first request of each symbol fills the cache so the warm path is timed
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            client = Client()
+            results = {}
+            for name, url in (('ticker_view', '/ticker/{}/'), ('chart_json', '/ticker/{}/chart.json')):
+                urls = [url.format(symbol) for symbol in symbols]
+                sizes = [len(check(client.get(url), url).content) for url in urls]
+                results[name] = measure(client.get, urls, repeat)
+                results[name]['bytes'] = round(statistics.mean(sizes))
+            return results
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+    def print_report(self, results, baseline, threshold):
+        self.regressions = []
+        self.stdout.write(f"{'stage':>22} | {'median [ms]':>11} | {'min [ms]':>9} | {'peak [KiB]':>10} | "
+                          f"{'bytes':>9} | {'vs base':>8}")
+        for name, result in results.items():
+            line = (f"{name:>22} | {result['median_ms']:>11.2f} | {result['min_ms']:>9.2f} | "
+                    f"{result['peak_kib']:>10.1f} | {result.get('bytes', '-'):>9} | ")
+            base = baseline.get(name)
+            if base:
+                ratio = result['median_ms'] / base['median_ms']
+                line += f'{ratio:>7.2f}x'
+                if ratio > 1 + threshold:
+                    line += ' REGRESSION'
+                    self.regressions.append(name)
+            self.stdout.write(line)
+
+
+def measure(func, items, repeat):
+    # Time per call, averaged over the items in each of the `repeat` rounds. Allocations are
+    # traced in an extra call only, tracemalloc slows everything down.
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            func(item)
+        timings.append((time.perf_counter() - started) * 1000 / len(items))
+    tracemalloc.start()
+    try:
+        func(items[0])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'median_ms': statistics.median(timings),
+        'min_ms': min(timings),
+        'peak_kib': peak / 1024,
+    }
+
+
+def check(response, url):
+    if response.status_code != 200:
+        raise CommandError(f'{url} answered {response.status_code}')
+    return response
+
+
+def load_baseline(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)['stages']
+
+
+def environment(symbols, options):
+    return {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'source': options['source'],
+        'repeat': options['repeat'],
+        'symbols': symbols,
+    }
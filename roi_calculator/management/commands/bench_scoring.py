@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from roi_calculator.scoring import get_scoring_model, score_frame
+from roi_calculator.utils import stock_overall_score, stock_scoring
+
+
+class Command(BaseCommand):
+    help = 'Compares scoring a universe of random fundamentals row by row and with the batch scoring engine.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        fundamentals = random_fundamentals(options['rows'], options['seed'])
+        records = fundamentals.to_dict('records')
+        for record in records:
+            for key, value in record.items():
+                if pd.isna(value):
+                    record[key] = None
+
+        scalar_time, scalar = best_of(options['repeat'], lambda: [score_row(record) for record in records])
+        batch_time, batch = best_of(options['repeat'], lambda: score_frame(fundamentals))
+
+        for i, (scores, overall) in enumerate(scalar):
+            row = batch.iloc[i]
+            expected = [row[f'{metric}_score'] for metric in scores] + [row['overall_score']]
+            if [score[0][0] for score in scores.values()] + [overall[0] if overall else 0.0] != expected:
+                raise CommandError(f'batch scoring differs from stock_scoring for row {i}')
+
+        self.stdout.write(f"rows:    {options['rows']}")
+        self.stdout.write(f'scalar:  {scalar_time * 1000:10.1f} ms')
+        self.stdout.write(f'batch:   {batch_time * 1000:10.1f} ms')
+        self.stdout.write(f'speedup: {scalar_time / batch_time:10.1f}x')
+
+
+def score_row(record):
+    scores = stock_scoring(record)
+    return scores, stock_overall_score(scores)
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def random_fundamentals(rows, seed):
+    # values spread around the benchmarks, with some negatives and missing values
+    rng = np.random.default_rng(seed)
+    model = get_scoring_model()
+    columns = {}
+    for i, metric in enumerate(model.metrics):
+        low, high = model.thresholds[i][0], model.thresholds[i][-1]
+        values = rng.uniform(low - (high - low), high + (high - low), rows)
+        values[rng.random(rows) < 0.05] = np.nan
+        columns[metric] = values
+    return pd.DataFrame(columns, index=[f'T{i:05d}' for i in range(rows)])
@@ -0,0 +1,88 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+# what a fresh worker process runs, each in a new interpreter
+SCENARIOS = {
+    # gunicorn importing the WSGI application
+    'boot': 'import StockValuation.wsgi',
+    # plus what the first request imports, the URLconf with the views and the lazy libraries
+    'first_request': 'import StockValuation.wsgi\nfrom roi_calculator.startup import preload\npreload()',
+}
+
+
+class Command(BaseCommand):
+    help = ('Times the startup of a worker process in fresh interpreters and summarises '
+            '`python -X importtime` by package, optionally against a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='packages listed per scenario')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='a scenario more than this fraction slower than the baseline is a regression')
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['scenarios']
+
+        results = {}
+        regressions = []
+        for name, code in SCENARIOS.items():
+            timings = [run(code)[0] for _ in range(options['repeat'])]
+            packages = import_times(run(code, importtime=True)[1])
+            results[name] = {
+                'median_ms': statistics.median(timings),
+                'min_ms': min(timings),
+                'import_ms': sum(packages.values()),
+                'packages': dict(packages.most_common()),
+            }
+            line = f"{name}: {results[name]['median_ms']:.0f} ms median, {results[name]['import_ms']:.0f} ms importing"
+            base = baseline.get(name)
+            if base:
+                ratio = results[name]['median_ms'] / base['median_ms']
+                line += f', {ratio:.2f}x the baseline'
+                if ratio > 1 + options['threshold']:
+                    line += ' REGRESSION'
+                    regressions.append(name)
+            self.stdout.write(line)
+            for package, ms in packages.most_common(options['top']):
+                self.stdout.write(f'{ms:>10.1f} ms  {package}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'python': sys.version.split()[0], 'scenarios': results}, f, indent=2)
+        if regressions:
+            raise CommandError(f"slower than the baseline: {', '.join(regressions)}")
+
+
+def run(code, importtime=False):
+    # wall time in milliseconds and stderr of one interpreter running `code`
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='StockValuation.settings', PRELOAD_IMPORTS='0')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    started = time.perf_counter()
+    process = subprocess.run(command, env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if process.returncode:
+        raise CommandError(process.stderr.strip().splitlines()[-1])
+    return elapsed, process.stderr
+
+
+def import_times(stderr):
+    # milliseconds spent in the modules of each top-level package, from the self times
+    packages = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, _, module = line[len('import time:'):].split('|')
+        packages[module.strip().split('.')[0]] += int(own) / 1000
+    return packages
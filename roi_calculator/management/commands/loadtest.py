@@ -0,0 +1,96 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    'wsgi': lambda port, workers: [
+        'gunicorn', 'StockValuation.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--timeout', '120'],
+    'asgi': lambda port, workers: [
+        'daphne', '-b', '127.0.0.1', '-p', str(port), 'StockValuation.asgi:application'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares WSGI (gunicorn) and ASGI (daphne) throughput of the ticker page against the stub data source.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=60, help='requests per server')
+        parser.add_argument('--concurrency', type=int, default=20, help='concurrent clients')
+        parser.add_argument('--latency', type=float, default=0.5, help='seconds per stub upstream call')
+        parser.add_argument('--workers', type=int, default=3, help='gunicorn workers, same as the Dockerfile')
+        parser.add_argument('--upstream-workers', type=int, default=64,
+                            help='UPSTREAM_MAX_WORKERS of the ASGI server, its only process does all the waiting')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--servers', nargs='+', choices=SERVERS, default=list(SERVERS))
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       VALUATION_DATA_SOURCE='stub',
+                       STUB_LATENCY=str(options['latency']),
+                       SQLITE_PATH=os.path.join(tmp, 'loadtest.sqlite3'),
+                       DEBUG='0')
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+                           cwd=settings.BASE_DIR, env=env, check=True)
+            self.stdout.write(f"{'server':>8} | {'requests':>8} | {'errors':>6} | {'req/s':>7} | "
+                              f"{'p50 [s]':>7} | {'p95 [s]':>7}")
+            for name in options['servers']:
+                server_env = dict(env, ASYNC_VIEWS='0')
+                if name == 'asgi':
+                    server_env.update(ASYNC_VIEWS='1', UPSTREAM_MAX_WORKERS=str(options['upstream_workers']))
+                command = SERVERS[name](options['port'], options['workers'])
+                server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=server_env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                try:
+                    base_url = f"http://127.0.0.1:{options['port']}"
+                    wait_for_server(base_url)
+                    # a distinct symbol per request, so every request takes the cold path
+                    urls = [f'{base_url}/ticker/{name.upper()}{i:04d}/' for i in range(options['requests'])]
+                    self.report(name, run_clients(urls, options['concurrency']))
+                finally:
+                    server.terminate()
+                    server.wait()
+
+    def report(self, name, results):
+        elapsed, latencies, errors = results
+        latencies = sorted(latencies) or [0]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(f'{name:>8} | {len(latencies) + errors:>8} | {errors:>6} | '
+                          f'{len(latencies) / elapsed:>7.2f} | {statistics.median(latencies):>7.2f} | {p95:>7.2f}')
+
+
+def wait_for_server(base_url, timeout=30):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'server at {base_url} did not start')
+
+
+def run_clients(urls, concurrency):
+    def get(url):
+        started = time.monotonic()
+        try:
+            urllib.request.urlopen(url, timeout=120).read()
+        except OSError:
+            return None
+        return time.monotonic() - started
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(get, urls))
+    elapsed = time.monotonic() - started
+    latencies = [result for result in results if result is not None]
+    return elapsed, latencies, len(results) - len(latencies)
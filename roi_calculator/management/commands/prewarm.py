@@ -0,0 +1,41 @@
+import sys
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from roi_calculator.prewarm import run_cycle, track, untrack
+from roi_calculator.screener import parse_symbols
+
+
+class Command(BaseCommand):
+    help = ('Adds symbols to (or removes them from) the pre-warmed universe and refreshes '
+            'every tracked symbol which is not fresh, most stale and most requested first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*')
+        parser.add_argument('--file', help="file with the symbols, '-' reads them from stdin")
+        parser.add_argument('--remove', action='store_true', help='stop tracking the given symbols')
+        parser.add_argument('--no-refresh', action='store_true', help='only change the universe')
+        parser.add_argument('--workers', type=int, default=settings.PREWARM_WORKERS)
+
+    def handle(self, *args, **options):
+        text = ' '.join(options['symbols'])
+        if options['file'] == '-':
+            text += ' ' + sys.stdin.read()
+        elif options['file']:
+            with open(options['file']) as f:
+                text += ' ' + f.read()
+        symbols = parse_symbols(text)
+        if options['remove']:
+            untrack(symbols)
+        else:
+            track(symbols)
+        if not options['no_refresh']:
+            report(self, *run_cycle(options['workers'], timedelta(0)))
+
+
+def report(command, planned, failed):
+    command.stdout.write(f'{planned - len(failed)} of {planned} due symbols refreshed')
+    for symbol, error in failed.items():
+        command.stderr.write(f'{symbol}: {error}')
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from roi_calculator.archive import write_snapshot
+from roi_calculator.providers import get_provider
+from roi_calculator.snapshot import TickerSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Records the upstream data of the given symbols, to be replayed with VALUATION_DATA_SOURCE=fixtures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='+')
+        parser.add_argument('--dir', default=settings.FIXTURE_DIR)
+        parser.add_argument('--source', choices=('yfinance', 'stub'), default='yfinance')
+
+    def handle(self, *args, **options):
+        provider = get_provider(options['source'])
+        failed = []
+        for symbol in options['symbols']:
+            symbol = symbol.upper()
+            try:
+                snapshot = TickerSnapshot.fetch(provider.ticker(symbol))
+            except Exception as e:
+                self.stderr.write(f'{symbol}: {type(e).__name__}: {e}')
+                failed.append(symbol)
+                continue
+            write_snapshot(Path(options['dir']) / symbol, snapshot)
+            self.stdout.write(f'{symbol}: recorded')
+        if failed:
+            raise CommandError(f"could not record {' '.join(failed)}")
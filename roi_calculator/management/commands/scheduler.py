@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from roi_calculator.prewarm import run_cycle
+
+from .prewarm import report
+
+
+class Command(BaseCommand):
+    help = ('Keeps the pre-warmed universe fresh: every --interval seconds the symbols which would go '
+            'stale before the next run are refreshed. Several schedulers can share the job table.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.PREWARM_INTERVAL)
+        parser.add_argument('--workers', type=int, default=settings.PREWARM_WORKERS)
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        # refreshed ahead of the next run, so requests never find a tracked symbol stale
+        horizon = timedelta(seconds=2 * interval)
+        try:
+            while True:
+                started = time.monotonic()
+                planned, failed = run_cycle(options['workers'], horizon)
+                if planned:
+                    report(self, planned, failed)
+                time.sleep(max(0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            # claims of unfinished refreshes run out after PREWARM_LEASE
+            pass
@@ -0,0 +1,42 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from roi_calculator.screener import FORMATS, parse_symbols, screen, serialize
+
+
+class Command(BaseCommand):
+    help = 'Values a list of symbols in parallel and writes one row per symbol as soon as it is done.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*')
+        parser.add_argument('--file', help="file with the symbols, '-' reads them from stdin")
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--workers', type=int, default=settings.SCREENER_MAX_WORKERS)
+
+    def handle(self, *args, **options):
+        text = ' '.join(options['symbols'])
+        if options['file'] == '-':
+            text += ' ' + sys.stdin.read()
+        elif options['file']:
+            with open(options['file']) as f:
+                text += ' ' + f.read()
+        symbols = parse_symbols(text)
+        if not symbols:
+            raise CommandError('No symbols given.')
+
+        failed = []
+        rows = screen(symbols, options['workers'])
+        for line in serialize(record_failures(rows, failed), options['format']):
+            self.stdout.write(line, ending='')
+            self.stdout.flush()
+        if failed:
+            self.stderr.write(f"{len(failed)} of {len(symbols)} symbols could not be valued: {' '.join(failed)}")
+
+
+def record_failures(rows, failed):
+    for row in rows:
+        if row['error']:
+            failed.append(row['symbol'])
+        yield row
@@ -0,0 +1,56 @@
+import csv
+import os
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# symbol directories of all stocks and ETFs listed on the US exchanges
+LISTINGS = (
+    'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt',
+    'https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt',
+)
+
+
+class Command(BaseCommand):
+    help = ('Writes the symbol listing behind the search autocomplete and the ticker validation '
+            'from the Nasdaq Trader symbol directories.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*', default=LISTINGS,
+                            help='URLs or local copies of nasdaqlisted.txt / otherlisted.txt')
+        parser.add_argument('--output', default=settings.SYMBOL_LISTING_FILE)
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('No output file, set SYMBOL_LISTING_FILE or pass --output.')
+        listing = {}
+        for source in options['sources']:
+            listing.update(parse_directory(read_source(source)))
+        tmp = f"{options['output']}.{os.getpid()}"
+        with open(tmp, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('symbol', 'name'))
+            writer.writerows(sorted(listing.items()))
+        os.replace(tmp, options['output'])
+        self.stdout.write(f"{len(listing)} symbols written to {options['output']}")
+
+
+def read_source(source):
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=30)
+        response.raise_for_status()
+        return response.text
+    with open(source) as f:
+        return f.read()
+
+
+def parse_directory(text):
+    # pipe separated with a header row and a "File Creation Time" footer, test issues are skipped
+    lines = [line for line in text.splitlines() if line and not line.startswith('File Creation Time')]
+    for row in csv.DictReader(lines, delimiter='|'):
+        symbol = row.get('Symbol') or row.get('ACT Symbol') or ''
+        if row.get('Test Issue') == 'Y' or not symbol.replace('.', '').isalnum():
+            continue
+        # Yahoo writes share classes with a dash, BRK.B is BRK-B
+        yield symbol.replace('.', '-'), row['Security Name']
@@ -0,0 +1,115 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+# upper bounds in seconds, Prometheus' default buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# (name, seconds) of the spans of the current request, None outside of requests
+_spans = contextvars.ContextVar('spans', default=None)
+_lock = threading.Lock()
+_histograms = {}
+_counters = defaultdict(int)
+
+HELP = {
+    'valuatio_stage_seconds': ('histogram', 'Duration of the stages of the valuation pipeline.'),
+    'valuatio_request_seconds': ('histogram', 'Duration of the requests by view.'),
+    'valuatio_cache_lookups_total': ('counter', 'Cache lookups by cache and result.'),
+    'valuatio_upstream_errors_total': ('counter', 'Failed upstream calls by call and error.'),
+}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+
+def observe(name, labels, seconds):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(name, **labels):
+    with _lock:
+        _counters[(name, tuple(sorted(labels.items())))] += 1
+
+
+@contextmanager
+def span(name):
+    # times the block into the stage histogram and the Server-Timing header of the request
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        observe('valuatio_stage_seconds', {'stage': name}, seconds)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((name, seconds))
+
+
+def start_request():
+    spans = []
+    return spans, _spans.set(spans)
+
+
+def end_request(token):
+    _spans.reset(token)
+
+
+def in_context(func):
+    # Binds func to the caller's context, for work handed to another thread,
+    # so its spans end up in the request which waits for it.
+    context = contextvars.copy_context()
+    return lambda *args: context.run(func, *args)
+
+
+def server_timing(spans):
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in spans)
+
+
+def render():
+    # Prometheus text exposition format, values of this process only
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    for name, (metric_type, description) in HELP.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {metric_type}']
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
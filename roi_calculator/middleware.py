@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+from .finders import PLOTLY_JS
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware which also supports async middleware chains.
+
+    whitenoise 6.1 is sync only, so under ASGI Django would run every request, including
+    the async views below it, on its single thread-sensitive thread. plotly.js is served
+    as immutable, the page requests it with the plotly version in the query string.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if asyncio.iscoroutinefunction(get_response):
+            # same marker Django's MiddlewareMixin uses
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    def immutable_file_test(self, path, url):
+        return url == settings.STATIC_URL + PLOTLY_JS or super().immutable_file_test(path, url)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+
+class ServerTimingMiddleware:
+    """Collects the spans of each request into its Server-Timing header and the request histogram."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        spans, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, spans, started)
+
+    async def __acall__(self, request):
+        spans, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, spans, started)
+
+    def finish(self, request, response, spans, started):
+        seconds = time.perf_counter() - started
+        view = request.resolver_match.url_name if request.resolver_match else 'unmatched'
+        metrics.observe('valuatio_request_seconds', {'view': view}, seconds)
+        response['Server-Timing'] = metrics.server_timing(spans + [('total', seconds)])
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.13 on 2026-10-18 12:50
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedFundamentals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=16, unique=True)),
+                ('fundamentals', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('data_saved_on', models.DateTimeField()),
+                ('statements_saved_on', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'cached fundamentals',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.13 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roi_calculator', '0002_refreshjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedSymbol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=16, unique=True)),
+                ('reason', models.TextField()),
+                ('failures', models.PositiveIntegerField(default=1)),
+                ('failed_on', models.DateTimeField()),
+                ('retry_after', models.DateTimeField()),
+            ],
+        ),
+    ]
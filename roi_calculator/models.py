@@ -1,3 +1,51 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class CachedFundamentals(models.Model):
+    symbol = models.CharField(max_length=16, unique=True)
+    # dictionary returned by utils.valuation_dictionary (without data_saved_on)
+    fundamentals = models.JSONField(encoder=DjangoJSONEncoder)
+    # last time any part of the fundamentals was refreshed
+    data_saved_on = models.DateTimeField()
+    # last time the financial statements (balance sheet, earnings, ...) were downloaded
+    statements_saved_on = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = 'cached fundamentals'
+
+    def __str__(self):
+        return self.symbol
+
+
+class RefreshJob(models.Model):
+    """A symbol of the pre-warmed universe, refreshed by `manage.py prewarm` and `manage.py scheduler`."""
+
+    symbol = models.CharField(max_length=16, unique=True)
+    # lookups since the symbol was added, halved after every refresh so recent requests weigh most
+    hits = models.PositiveIntegerField(default=0)
+    last_requested_on = models.DateTimeField(null=True, blank=True)
+    # claimed by a scheduler until then, the claim of a crashed scheduler runs out by itself
+    leased_until = models.DateTimeField(null=True, blank=True)
+    last_run_on = models.DateTimeField(null=True, blank=True)
+    # failed refreshes in a row, retried after not_before
+    failures = models.PositiveIntegerField(default=0)
+    not_before = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.symbol
+
+
+class FailedSymbol(models.Model):
+    """A symbol the valuation failed for, not tried again before retry_after."""
+
+    symbol = models.CharField(max_length=16, unique=True)
+    reason = models.TextField()
+    # failures in a row, every one doubles the time until the next try
+    failures = models.PositiveIntegerField(default=1)
+    failed_on = models.DateTimeField()
+    retry_after = models.DateTimeField()
+
+    def __str__(self):
+        return self.symbol
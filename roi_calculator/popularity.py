@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RefreshJob
+
+_lock = threading.Lock()
+_hits = Counter()
+_flushed = time.monotonic()
+# (time read, symbols with a refresh job)
+_tracked = (None, frozenset())
+
+
+def tracked_symbols():
+    # read again every PREWARM_HITS_FLUSH seconds, a symbol tracked meanwhile is counted from then on
+    global _tracked
+    read_on, symbols = _tracked
+    if read_on is None or time.monotonic() - read_on > settings.PREWARM_HITS_FLUSH:
+        symbols = frozenset(RefreshJob.objects.values_list('symbol', flat=True))
+        _tracked = (time.monotonic(), symbols)
+    return symbols
+
+
+def forget_tracked():
+    global _tracked
+    _tracked = (None, frozenset())
+
+
+def count_hit(symbol):
+    """Counts a lookup of a tracked symbol in memory.
+
+    Page views only read the database, the counts of the worker process are written in one
+    transaction every PREWARM_HITS_FLUSH seconds.
+    """
+    global _flushed
+    if symbol not in tracked_symbols():
+        return
+    with _lock:
+        _hits[symbol] += 1
+        due = time.monotonic() - _flushed >= settings.PREWARM_HITS_FLUSH
+        if due:
+            _flushed = time.monotonic()
+    if due:
+        flush_hits()
+
+
+def flush_hits():
+    with _lock:
+        hits = dict(_hits)
+        _hits.clear()
+    if not hits:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        for symbol, count in hits.items():
+            RefreshJob.objects.filter(symbol=symbol).update(hits=F('hits') + count, last_requested_on=now)
@@ -0,0 +1,117 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import singleflight
+from .cache import FRESH, flight_key, freshness, refresh_fundamentals, refresh_quote, refreshed
+from .models import CachedFundamentals, RefreshJob
+from .popularity import forget_tracked
+from .screener import parse_symbols
+
+# longest wait before a failing symbol is tried again
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+
+def track(symbols):
+    RefreshJob.objects.bulk_create([RefreshJob(symbol=symbol) for symbol in symbols], ignore_conflicts=True)
+    forget_tracked()
+
+
+def untrack(symbols):
+    RefreshJob.objects.filter(symbol__in=symbols).delete()
+    forget_tracked()
+
+
+def universe_file_symbols():
+    if not settings.PREWARM_UNIVERSE_FILE:
+        return []
+    with open(settings.PREWARM_UNIVERSE_FILE) as f:
+        return parse_symbols(f.read())
+
+
+def due_refresh(entry, now, horizon):
+    # (refresh, staleness) when the entry is not fresh any more `horizon` from now, the staleness
+    # is its age in TTLs. Symbols which have never been valued come first.
+    if entry is None:
+        return refresh_fundamentals, math.inf
+    for age, field_class, refresh in (
+            (now - entry.statements_saved_on + horizon, 'statements', refresh_fundamentals),
+            (now - entry.data_saved_on + horizon, 'quote', refresh_quote)):
+        if freshness(age, field_class) != FRESH:
+            return refresh, age.total_seconds() / settings.VALUATION_CACHE_TTL[field_class][0]
+    return None, 0
+
+
+def plan(now, horizon):
+    """The jobs due for a refresh within ``horizon``, most urgent first, as (job, refresh) pairs.
+
+    Staleness is weighted by the logarithm of the recent lookups, so a popular symbol is
+    refreshed before an unpopular one which expired at about the same time.
+    """
+    available = Q(leased_until__isnull=True) | Q(leased_until__lt=now)
+    retry = Q(not_before__isnull=True) | Q(not_before__lte=now)
+    jobs = list(RefreshJob.objects.filter(available, retry))
+    entries = CachedFundamentals.objects.filter(symbol__in=[job.symbol for job in jobs]).only(
+        'symbol', 'data_saved_on', 'statements_saved_on')
+    entries = {entry.symbol: entry for entry in entries}
+    due = []
+    for job in jobs:
+        refresh, staleness = due_refresh(entries.get(job.symbol), now, horizon)
+        if refresh is not None:
+            due.append((staleness * (1 + math.log1p(job.hits)), job.hits, job, refresh))
+    due.sort(key=lambda item: item[:2], reverse=True)
+    return [(job, refresh) for _, _, job, refresh in due]
+
+
+def claim(job):
+    # one scheduler per job, the update only matches when nobody else holds the lease
+    now = timezone.now()
+    available = Q(leased_until__isnull=True) | Q(leased_until__lt=now)
+    leased_until = now + timedelta(seconds=settings.PREWARM_LEASE)
+    return RefreshJob.objects.filter(available, pk=job.pk).update(leased_until=leased_until) == 1
+
+
+def run_job(job, refresh):
+    # Returns None when done or skipped, the error message when the refresh failed. The
+    # refresh shares its flight with the requests for the symbol and writes the same cache.
+    if not claim(job):
+        return None
+    symbol = job.symbol
+    jobs = RefreshJob.objects.filter(pk=job.pk)
+    try:
+        singleflight.do(flight_key(symbol), lambda: refresh(symbol), lambda: refreshed(symbol))
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        delay = min(timedelta(seconds=settings.PREWARM_INTERVAL * 2 ** min(job.failures, 16)), MAX_RETRY_DELAY)
+        jobs.update(leased_until=None, failures=F('failures') + 1, not_before=timezone.now() + delay,
+                    last_error=error)
+        return error
+    jobs.update(leased_until=None, last_run_on=timezone.now(), failures=0, not_before=None,
+                last_error='', hits=F('hits') / 2)
+    return None
+
+
+def run_cycle(workers, horizon):
+    """Refreshes every due job with ``workers`` threads.
+
+    Returns the number of due jobs and the errors of the failed ones by symbol.
+    """
+    track(universe_file_symbols())
+    jobs = plan(timezone.now(), horizon)
+
+    def run(planned):
+        try:
+            return run_job(*planned)
+        finally:
+            # pool threads outlive the cycle, do not leave their connections open
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        errors = executor.map(run, jobs)
+        failed = {job.symbol: error for (job, _), error in zip(jobs, errors) if error is not None}
+    return len(jobs), failed
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits')
+BARS = np.dtype([('Date', 'datetime64[D]')] + [(column, 'f8') for column in COLUMNS])
+PERIODS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '1y': pd.DateOffset(years=1),
+    '5y': pd.DateOffset(years=5),
+}
+# downloaded when a symbol is not in the store yet
+FULL_PERIOD = '5y'
+
+
+class PriceStore:
+    """Daily OHLCV bars per symbol in ``<directory>/<SYMBOL>.npy``, read memory-mapped.
+
+    ``update`` only downloads the bars since the last stored day. That day is downloaded
+    again since it may have been stored during trading hours. After a split or dividend
+    the whole period is downloaded again, the earlier closes have been adjusted for it.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, symbol):
+        return self.directory / f'{symbol.upper()}.npy'
+
+    def read(self, symbol):
+        path = self.path(symbol)
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def write(self, symbol, bars):
+        # several workers may update the same symbol, readers always see a complete file
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(symbol)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}')
+        with open(tmp, 'wb') as f:
+            np.save(f, bars)
+        os.replace(tmp, path)
+
+    def is_fresh(self, symbol):
+        # checked again after the quote TTL at the earliest, same as the price on the page
+        try:
+            age = time.time() - self.path(symbol).stat().st_mtime
+        except FileNotFoundError:
+            return False
+        return age <= settings.VALUATION_CACHE_TTL['quote'][0]
+
+    def update(self, ticker, timeout=None):
+        symbol = ticker.ticker
+        bars = self.read(symbol)
+        if bars is not None and len(bars) and self.is_fresh(symbol):
+            return bars
+        if bars is None or not len(bars):
+            bars = to_bars(ticker.history(period=FULL_PERIOD, interval='1d', timeout=timeout))
+        else:
+            last_day = bars['Date'][-1]
+            recent = to_bars(ticker.history(start=str(last_day), interval='1d', timeout=timeout))
+            if recent['Stock Splits'][1:].any() or recent['Dividends'][1:].any():
+                # Yahoo adjusts all earlier closes for a new split or dividend, the stored bars
+                # were adjusted for the ones before them only, so they are downloaded again
+                bars = to_bars(ticker.history(period=FULL_PERIOD, interval='1d', timeout=timeout))
+            elif len(recent):
+                bars = np.concatenate([bars[bars['Date'] < recent['Date'][0]], recent])
+        self.write(symbol, bars)
+        return bars
+
+
+class StoredHistoryTicker:
+    """yf.Ticker whose daily history comes from a PriceStore, everything else is passed through."""
+
+    def __init__(self, ticker, store):
+        self.ticker = ticker.ticker
+        self._upstream = ticker
+        self._store = store
+
+    def __getattr__(self, name):
+        return getattr(self._upstream, name)
+
+    def history(self, period='1mo', interval='1d', timeout=None, **kwargs):
+        if interval != '1d' or period not in PERIODS or kwargs:
+            return self._upstream.history(period=period, interval=interval, timeout=timeout, **kwargs)
+        history = to_frame(self._store.update(self._upstream, timeout))
+        if history.empty:
+            return history
+        return history[history.index > history.index[-1] - PERIODS[period]]
+
+
+def to_bars(history):
+    bars = np.zeros(len(history), dtype=BARS)
+    bars['Date'] = history.index.values.astype('datetime64[D]')
+    for column in COLUMNS:
+        bars[column] = history[column].to_numpy(dtype=float) if column in history else 0.0
+    return bars
+
+
+def to_frame(bars):
+    index = pd.DatetimeIndex(bars['Date'].astype('datetime64[ns]'), name='Date')
+    return pd.DataFrame({column: np.asarray(bars[column]) for column in COLUMNS}, index=index)
@@ -0,0 +1,60 @@
+import numpy as np
+from django.conf import settings
+
+from .values.math_constants import HUNDRED as H
+
+HORIZON = 7
+AFTER_TAX = 0.85
+PERCENTILES = (5, 25, 50, 75, 95)
+# log-normal spread of the scenario inputs around the observed values
+SPREADS = {
+    'roe': 0.2,
+    'roe_median': 0.2,
+    'payout_ratio_median': 0.1,
+    'pe_ratio_median': 0.25,
+}
+
+
+def project(tse_per_share, roe, roe_median, payout_ratio, exit_pe, price, horizon=HORIZON):
+    """Expected yearly return of every scenario, arguments are scalars or arrays with one value per scenario.
+
+    Same recursion as seven_yrs_overview and return_on_investment, year by year over all
+    scenarios at once and with the same order of operations, so one scenario gives the
+    same result as the scalar functions.
+    """
+    tse = np.asarray(tse_per_share, dtype=float)
+    earnings = tse * roe / H
+    dividend = earnings * payout_ratio
+    dividends = 0 + dividend
+    for _ in range(horizon - 1):
+        tse = tse + earnings - dividend
+        earnings = (tse * roe) / H
+        dividend = ((tse * roe_median) / H) * payout_ratio
+        dividends = dividends + dividend
+    expected_price_including_dividends = (earnings * exit_pe) + dividends * AFTER_TAX
+    expected_percentage_roi = expected_price_including_dividends / price
+    with np.errstate(invalid='ignore'):
+        return ((expected_percentage_roi + 1) ** (1 / horizon)) - 1
+
+
+def scenarios(fundamentals, count, seed=0):
+    # the inputs of `count` scenarios, varied around the observed values
+    rng = np.random.default_rng(seed)
+    return {
+        name: fundamentals[name] * np.exp(spread * rng.standard_normal(count))
+        for name, spread in SPREADS.items()
+    }
+
+
+def return_bands(fundamentals, count=None, seed=0):
+    # percentiles of the expected yearly return, None without the inputs of a projection
+    inputs = ('tse_per_share', 'price') + tuple(SPREADS)
+    if any(fundamentals.get(name) is None for name in inputs):
+        return None
+    varied = scenarios(fundamentals, count or settings.PROJECTION_SCENARIOS, seed)
+    returns = project(fundamentals['tse_per_share'], varied['roe'], varied['roe_median'],
+                      varied['payout_ratio_median'], varied['pe_ratio_median'], fundamentals['price'])
+    if np.isnan(returns).all():
+        return None
+    bands = np.nanpercentile(returns, PERCENTILES)
+    return {f'p{percentile}': float(value) for percentile, value in zip(PERCENTILES, bands)}
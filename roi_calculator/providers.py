@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from django.conf import settings
+
+from .archive import read_snapshot
+from .prices import PriceStore, StoredHistoryTicker
+from .stubs import SnapshotTicker, StubTicker
+from .upstream import TimeoutSession
+
+
+class FixtureNotFound(LookupError):
+    pass
+
+
+class YahooProvider:
+    """Live data from Yahoo Finance, the daily history goes through the local price store."""
+
+    def __init__(self, price_store_dir=''):
+        self.price_store = PriceStore(price_store_dir) if price_store_dir else None
+
+    def ticker(self, symbol):
+        # imported on the first lookup, the stub and fixture sources never load it
+        import yfinance as yf
+
+        ticker = yf.Ticker(symbol, session=TimeoutSession())
+        if self.price_store is None:
+            return ticker
+        return StoredHistoryTicker(ticker, self.price_store)
+
+
+class FixtureProvider:
+    """Replays the snapshots recorded by ``manage.py record_fixtures`` from ``<directory>/<symbol>/``.
+
+    Nothing is downloaded, so the valuation always computes from the same frames.
+    """
+
+    def __init__(self, directory, latency=0.0):
+        self.directory = Path(directory)
+        self.latency = latency
+
+    def ticker(self, symbol):
+        symbol = symbol.upper()
+        directory = self.directory / symbol
+        if not (directory / 'info.json.gz').exists():
+            raise FixtureNotFound(f'{symbol}: no fixture recorded in {self.directory}')
+        return SnapshotTicker(read_snapshot(directory, symbol), self.latency)
+
+
+class StubProvider:
+    """Synthetic data for any symbol, answering after ``latency`` seconds."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def ticker(self, symbol):
+        return StubTicker(symbol, latency=self.latency)
+
+
+def get_provider(name=None):
+    # the provider configured by VALUATION_DATA_SOURCE unless one is named
+    name = name or settings.VALUATION_DATA_SOURCE
+    if name == 'yfinance':
+        return YahooProvider(settings.PRICE_STORE_DIR)
+    if name == 'fixtures':
+        return FixtureProvider(settings.FIXTURE_DIR)
+    if name == 'stub':
+        return StubProvider(settings.STUB_LATENCY)
+    raise ValueError(f'unknown data source {name!r}')
+
+
+def upstream_ticker(symbol):
+    # the object every upstream call of the valuation goes through, see TickerSnapshot
+    return get_provider().ticker(symbol)
@@ -0,0 +1,150 @@
+import math
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from django.conf import settings
+
+from .models import CachedFundamentals
+from .scoring import NOT_AVAILABLE, SCORES, get_scoring_model
+
+# share of the peers a value has to beat for bm1 ... bm5, same levels as the absolute benchmarks
+RELATIVE_BENCHMARKS = (0.1, 0.25, 0.5, 0.75, 0.9)
+# peers tried in this order, the first group with enough values for the metric is used
+PEER_GROUPS = ('sector_country', 'sector', 'universe')
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def peer_groups(fundamentals):
+    sector, country = fundamentals.get('sector'), fundamentals.get('country')
+    groups = {'universe': ('universe',)}
+    if sector:
+        groups['sector'] = ('sector', sector)
+        if country:
+            groups['sector_country'] = ('sector_country', sector, country)
+    return groups
+
+
+def is_scorable(value, higher_is_better):
+    # same rule as the absolute scores, values <= 0 of lower-is-better metrics are not rated
+    return value is not None and math.isfinite(value) and (higher_is_better or value > 0)
+
+
+class PercentileIndex:
+    """Sorted values of every metric per peer group (sector and country, sector, whole universe).
+
+    Ranking a value is a bisect into the values of its peers. Entries are replaced one symbol at
+    a time, so a refreshed ticker only moves its own values.
+    """
+
+    def __init__(self, metrics):
+        # (metric, higher is better) pairs
+        self.metrics = metrics
+        self.values = {}
+        self.symbols = {}
+        # data_saved_on of the newest entry synced and when the last sync ran
+        self.synced_on = None
+        self.checked = None
+        self._lock = threading.RLock()
+
+    def update(self, symbol, fundamentals):
+        with self._lock:
+            self.remove(symbol)
+            entry = {}
+            groups = peer_groups(fundamentals).values()
+            for metric, higher_is_better in self.metrics:
+                value = fundamentals.get(metric)
+                if not is_scorable(value, higher_is_better):
+                    continue
+                entry[metric] = value
+                for group in groups:
+                    insort(self.values.setdefault((group, metric), []), value)
+            self.symbols[symbol] = (tuple(groups), entry)
+
+    def remove(self, symbol):
+        with self._lock:
+            groups, entry = self.symbols.pop(symbol, ((), {}))
+            for metric, value in entry.items():
+                for group in groups:
+                    values = self.values[group, metric]
+                    del values[bisect_left(values, value)]
+
+    def peers(self, fundamentals, metric):
+        groups = peer_groups(fundamentals)
+        for name in PEER_GROUPS:
+            values = self.values.get((groups.get(name), metric), [])
+            if len(values) >= settings.RELATIVE_MIN_PEERS:
+                return values
+        return None
+
+    def beaten(self, values, value, higher_is_better):
+        # share of the peers with a worse value
+        if higher_is_better:
+            return bisect_left(values, value) / len(values)
+        return (len(values) - bisect_right(values, value)) / len(values)
+
+    def sync(self):
+        # adds the entries refreshed since the last sync, by any worker process
+        with self._lock:
+            entries = CachedFundamentals.objects.order_by('data_saved_on')
+            if self.synced_on is not None:
+                entries = entries.filter(data_saved_on__gte=self.synced_on)
+            for symbol, fundamentals, saved_on in entries.values_list('symbol', 'fundamentals', 'data_saved_on'):
+                self.update(symbol, fundamentals)
+                self.synced_on = saved_on
+            self.checked = time.monotonic()
+
+    def score(self, fundamentals):
+        """Scores like ScoringModel.score, with the benchmarks taken from the peers of the ticker.
+
+        Metrics with too few peers keep their absolute score, metrics without absolute
+        benchmarks (ps_ratio) are n/a then.
+        """
+        model = get_scoring_model()
+        absolute = model.score(fundamentals)
+        stock_score = {}
+        for metric, higher_is_better, requires, weight in model.relative_metrics:
+            value = fundamentals.get(metric)
+            if (requires is not None and fundamentals.get(requires) is None) or \
+                    not is_scorable(value, higher_is_better):
+                stock_score[metric] = (NOT_AVAILABLE, weight)
+                continue
+            with self._lock:
+                values = self.peers(fundamentals, metric)
+                beaten = self.beaten(values, value, higher_is_better) if values else None
+            if beaten is None:
+                stock_score[metric] = absolute.get(metric, (NOT_AVAILABLE, weight))
+            else:
+                stock_score[metric] = (SCORES[bisect_right(RELATIVE_BENCHMARKS, beaten)], weight)
+        return stock_score
+
+
+def get_percentile_index():
+    # built from the cached fundamentals once per process, topped up every RELATIVE_SYNC_INTERVAL seconds
+    global _index
+    with _index_lock:
+        metrics = [(metric, higher) for metric, higher, _, _ in get_scoring_model().relative_metrics]
+        if _index is None or _index.metrics != metrics:
+            _index = PercentileIndex(metrics)
+        index = _index
+    if index.checked is None or time.monotonic() - index.checked > settings.RELATIVE_SYNC_INTERVAL:
+        index.sync()
+    return index
+
+
+def update_index(symbol, fundamentals):
+    # a refresh of this process moves the ticker right away, the others' on the next sync
+    if _index is not None:
+        _index.update(symbol, fundamentals)
+
+
+def scoring_version():
+    # changes whenever the scores of a ticker may change without its fundamentals changing,
+    # the same in every worker process once they synced the same entries
+    version = str(get_scoring_model().mtime)
+    if settings.SCORING_MODE == 'relative':
+        synced_on = get_percentile_index().synced_on
+        version += f'-{synced_on.timestamp():.6f}' if synced_on is not None else '-'
+    return version
@@ -0,0 +1,132 @@
+import math
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from configparser import ConfigParser
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.core.exceptions import ImproperlyConfigured
+
+SCORING_INI = Path(__file__).resolve().parent / 'values' / 'scoring.ini'
+BENCHMARKS = ('bm1', 'bm2', 'bm3', 'bm4', 'bm5')
+# score and css class by number of benchmarks the value meets
+SCORES = ((0, 'score-na'), (20, 'score-20'), (40, 'score-40'), (60, 'score-60'), (80, 'score-80'), (100, 'score-100'))
+NOT_AVAILABLE = SCORES[0]
+SCORE_VALUES = np.array([score for score, _ in SCORES])
+SCORE_CLASSES = np.array([class_name for _, class_name in SCORES], dtype=object)
+# same thresholds as stock_overall_score
+OVERALL_THRESHOLDS = (80, 60, 40, 20, 0)
+OVERALL_CLASSES = ('score-100', 'score-80', 'score-60', 'score-40', 'score-20')
+
+_model = None
+_model_lock = threading.Lock()
+
+
+class ScoringModel:
+    """Benchmarks and weights from scoring.ini, compiled into sorted threshold tables."""
+
+    def __init__(self, path=SCORING_INI):
+        self.path = Path(path)
+        self.mtime = os.stat(self.path).st_mtime_ns
+        parser = ConfigParser()
+        with open(self.path) as ini:
+            parser.read_file(ini)
+        self.metrics = []
+        self.higher_is_better = []
+        self.requires = []
+        self.weights = []
+        # benchmarks sorted ascending, so the score is a bisect into them
+        self.thresholds = []
+        # (metric, higher is better, requires, weight) of every metric, for scoring against the peers
+        self.relative_metrics = []
+        for metric in parser.sections():
+            section = parser[metric]
+            direction = section.get('direction')
+            if direction not in ('lower', 'higher'):
+                raise ImproperlyConfigured(f'scoring.ini [{metric}]: direction must be lower or higher')
+            self.relative_metrics.append(
+                (metric, direction == 'higher', section.get('requires'), section.getfloat('weight')))
+            if section.getboolean('relative', fallback=False):
+                continue
+            self.metrics.append(metric)
+            benchmarks = [section.getfloat(bm) for bm in BENCHMARKS]
+            thresholds = benchmarks if direction == 'lower' else benchmarks[::-1]
+            if thresholds != sorted(thresholds):
+                raise ImproperlyConfigured(f'scoring.ini [{metric}]: benchmarks must go from best to worst')
+            self.higher_is_better.append(direction == 'higher')
+            self.requires.append(section.get('requires'))
+            self.weights.append(section.getfloat('weight'))
+            self.thresholds.append(thresholds)
+        self.metrics = tuple(self.metrics)
+        self.threshold_table = np.array(self.thresholds, dtype=float).reshape(len(self.metrics), len(BENCHMARKS))
+
+    def score(self, fundamentals):
+        # {metric: ((score, css class), weight)}, same shape the templates and stock_overall_score use
+        stock_score = {}
+        for i, metric in enumerate(self.metrics):
+            if self.requires[i] is not None and fundamentals[self.requires[i]] is None:
+                stock_score[metric] = (NOT_AVAILABLE, self.weights[i])
+            else:
+                stock_score[metric] = (self.score_value(i, fundamentals[metric]), self.weights[i])
+        return stock_score
+
+    def score_value(self, i, value):
+        if value is None or math.isnan(value):
+            return NOT_AVAILABLE
+        thresholds = self.thresholds[i]
+        if self.higher_is_better[i]:
+            return SCORES[bisect_right(thresholds, value)]
+        if value <= 0:
+            return NOT_AVAILABLE
+        return SCORES[len(thresholds) - bisect_left(thresholds, value)]
+
+    def score_frame(self, fundamentals):
+        """Scores a DataFrame of fundamentals (one row per ticker, one column per metric) at once.
+
+        Returns a DataFrame with ``<metric>_score`` and ``<metric>_class`` columns plus
+        ``overall_score`` and ``overall_class``, equal to what stock_scoring and
+        stock_overall_score give for each row.
+        """
+        columns = {}
+        total = np.zeros(len(fundamentals))
+        weights = 0
+        for i, metric in enumerate(self.metrics):
+            values = pd.to_numeric(fundamentals[metric], errors='coerce').to_numpy(dtype=float)
+            thresholds = self.threshold_table[i]
+            if self.higher_is_better[i]:
+                level = np.searchsorted(thresholds, values, side='right')
+            else:
+                level = len(thresholds) - np.searchsorted(thresholds, values, side='left')
+                level[values <= 0] = 0
+            level[np.isnan(values)] = 0
+            if self.requires[i] is not None:
+                level[fundamentals[self.requires[i]].isna().to_numpy()] = 0
+            score = SCORE_VALUES[level]
+            columns[f'{metric}_score'] = score
+            columns[f'{metric}_class'] = SCORE_CLASSES[level]
+            # accumulated in the same order as stock_overall_score, so the floats match exactly
+            total = total + score * self.weights[i]
+            weights += self.weights[i]
+        overall = total / weights
+        columns['overall_score'] = overall
+        columns['overall_class'] = np.select(
+            [overall > threshold for threshold in OVERALL_THRESHOLDS], OVERALL_CLASSES, default=None)
+        return pd.DataFrame(columns, index=fundamentals.index)
+
+
+def score_frame(fundamentals):
+    return get_scoring_model().score_frame(fundamentals)
+
+
+def get_scoring_model():
+    # loaded once per process, reloaded when scoring.ini changes on disk
+    global _model
+    model = _model
+    if model is not None and os.stat(model.path).st_mtime_ns == model.mtime:
+        return model
+    with _model_lock:
+        if _model is None or os.stat(_model.path).st_mtime_ns != _model.mtime:
+            _model = ScoringModel()
+        return _model
@@ -0,0 +1,88 @@
+import csv
+import json
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from .cache import get_fundamentals, json_compatible
+from .projection import return_bands
+from .utils import seven_yrs_overview, return_on_investment, stock_overall_score, stock_scoring
+
+FIELDS = (
+    'symbol', 'name', 'price', 'currency', 'overall_score', 'expected_yearly_return',
+    'expected_percentage_roi', 'return_p5', 'return_p50', 'return_p95', 'pe_ratio', 'pe_ratio_median',
+    'roe', 'roe_median', 'dividend_yield', 'f_score', 'z_score', 'error',
+)
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def parse_symbols(text):
+    # comma or whitespace separated, duplicates are valued once
+    symbols = (symbol.upper() for symbol in re.split(r'[\s,;]+', text) if symbol)
+    return list(dict.fromkeys(symbols))
+
+
+def value_symbol(symbol):
+    # one screener row, an error is reported in the row instead of aborting the batch
+    try:
+        fundamentals = get_fundamentals(symbol)
+        overview = seven_yrs_overview(fundamentals)
+        roi = return_on_investment(fundamentals, overview)
+        overall_score = stock_overall_score(stock_scoring(fundamentals))
+        bands = return_bands(fundamentals) or {}
+    except Exception as e:
+        return {'symbol': symbol, 'error': f'{type(e).__name__}: {e}'}
+    finally:
+        # pool threads outlive the request, do not leave their connections open
+        connection.close()
+    row = {field: fundamentals.get(field) for field in FIELDS}
+    row.update({
+        'symbol': symbol,
+        'overall_score': overall_score[0] if overall_score else None,
+        'expected_yearly_return': roi['expected_yearly_return'],
+        'expected_percentage_roi': roi['expected_percentage_roi'],
+        'return_p5': bands.get('p5'),
+        'return_p50': bands.get('p50'),
+        'return_p95': bands.get('p95'),
+        'error': None,
+    })
+    return json_compatible(row)
+
+
+def screen(symbols, workers, value=value_symbol):
+    # Yields the rows in the order they complete. Only `workers` symbols are
+    # submitted at a time, so a long watchlist does not queue up all at once.
+    symbols = iter(symbols)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {executor.submit(value, symbol) for symbol in islice(symbols, workers)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                running.update(executor.submit(value, symbol) for symbol in islice(symbols, 1))
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class Echo:
+    # file-like object handing back what csv.writer writes, see the Django docs on streaming CSV
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(Echo(), fieldnames=FIELDS, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def serialize(rows, output_format):
+    return csv_lines(rows) if output_format == 'csv' else ndjson_lines(rows)
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on Windows
+    fcntl = None
+
+_calls = {}
+_calls_lock = threading.Lock()
+_async_calls = {}
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class FileLock:
+    """Exclusive flock on a file in SINGLE_FLIGHT_LOCK_DIR, shared by all worker processes."""
+
+    def __init__(self, key):
+        os.makedirs(settings.SINGLE_FLIGHT_LOCK_DIR, exist_ok=True)
+        self.path = os.path.join(settings.SINGLE_FLIGHT_LOCK_DIR, re.sub(r'[^\w.-]', '_', key) + '.lock')
+        self.file = None
+        self.waited = False
+
+    def acquire(self, timeout):
+        # returns False when another process kept the lock for longer than timeout
+        if fcntl is None:
+            return False
+        self.file = open(self.path, 'a')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                self.waited = True
+                if time.monotonic() > deadline:
+                    self.file.close()
+                    return False
+                time.sleep(0.05)
+
+    def release(self):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def do(key, func, recheck=None):
+    # Runs func once for all concurrent callers with the same key and hands every caller its
+    # result. Threads of this process wait for the in-flight call. With recheck, other worker
+    # processes wait on a file lock and then call recheck, which returns the result the first
+    # worker stored (or None to run func after all).
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = Call()
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+    try:
+        call.result = _call_locked(key, func, recheck) if recheck is not None else func()
+        return call.result
+    except Exception as error:
+        call.error = error
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.done.set()
+
+
+async def ado(key, func, recheck=None):
+    # do() for coroutine functions, callers on the event loop await the in-flight call
+    future = _async_calls.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    future = _async_calls[key] = asyncio.get_running_loop().create_future()
+    try:
+        result = await (_acall_locked(key, func, recheck) if recheck is not None else func())
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as error:
+        future.set_exception(error)
+        # mark the exception as retrieved when nobody else waited for it
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del _async_calls[key]
+
+
+def _call_locked(key, func, recheck):
+    lock = FileLock(key)
+    acquired = lock.acquire(settings.SINGLE_FLIGHT_TIMEOUT)
+    try:
+        if lock.waited:
+            result = recheck()
+            if result is not None:
+                return result
+        return func()
+    finally:
+        if acquired:
+            lock.release()
+
+
+async def _acall_locked(key, func, recheck):
+    lock = FileLock(key)
+    acquired = await asyncio.get_running_loop().run_in_executor(None, lock.acquire, settings.SINGLE_FLIGHT_TIMEOUT)
+    try:
+        if lock.waited:
+            result = await recheck()
+            if result is not None:
+                return result
+        return await func()
+    finally:
+        if acquired:
+            lock.release()
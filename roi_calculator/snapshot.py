@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import wraps
+
+import pandas as pd
+from django.conf import settings
+
+from . import upstream
+from .failures import check_info, check_statements
+from .metrics import in_context, increment, span
+from .upstream import EmptyResponse, UpstreamError, set_timeout
+
+# every yfinance dataset the valuation needs, fetched exactly once per valuation
+DATASETS = (
+    'info',
+    'balancesheet',
+    'quarterly_balancesheet',
+    'financials',
+    'quarterly_financials',
+    'quarterly_cashflow',
+    'earnings',
+    'quarterly_earnings',
+    'shares',
+    'dividends',
+    'history',
+)
+# yfinance fills all of these from one scrape of the quote pages
+FUNDAMENTAL_DATASETS = DATASETS[:-2]
+HISTORY_PERIOD = '5y'
+CHART_MONTHS = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UpstreamTimeout(UpstreamError):
+    pass
+
+
+class TickerSnapshot(namedtuple('TickerSnapshot', ('symbol',) + DATASETS)):
+    """Immutable set of the raw upstream data one valuation is computed from.
+
+    Attributes carry the same names as the yf.Ticker properties, ``history`` is the
+    daily price history for the last five years.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def fetch(cls, ticker):
+        # Every upstream call runs concurrently on the shared pool, so the snapshot takes
+        # as long as the slowest call. Each call gets UPSTREAM_CALL_TIMEOUT seconds and the
+        # whole snapshot UPSTREAM_DEADLINE seconds, UpstreamTimeout is raised otherwise.
+        call_timeout = settings.UPSTREAM_CALL_TIMEOUT
+        submitted = time.monotonic()
+        deadline = submitted + settings.UPSTREAM_DEADLINE
+        futures = {
+            upstream_executor().submit(in_context(call), ticker, call_timeout): name
+            for name, call in UPSTREAM_CALLS.items()
+        }
+        datasets = {}
+        pending = set(futures)
+        try:
+            while pending:
+                timeout = min(submitted + call_timeout, deadline) - time.monotonic()
+                done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    for future in pending:
+                        increment('valuatio_upstream_errors_total', call=futures[future], error='UpstreamTimeout')
+                    names = ', '.join(sorted(futures[future] for future in pending))
+                    raise UpstreamTimeout(f'{ticker.ticker}: {names} did not finish in time')
+                for future in done:
+                    datasets.update(future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+        return cls(symbol=ticker.ticker, **datasets)
+
+    @classmethod
+    async def afetch(cls, ticker):
+        # same as fetch(), but the event loop stays free while the upstream calls run
+        calls = (run_upstream(f'{ticker.ticker}: {name}', call, ticker, settings.UPSTREAM_CALL_TIMEOUT)
+                 for name, call in UPSTREAM_CALLS.items())
+        try:
+            results = await asyncio.wait_for(asyncio.gather(*calls), settings.UPSTREAM_DEADLINE)
+        except asyncio.TimeoutError:
+            increment('valuatio_upstream_errors_total', call='snapshot', error='UpstreamTimeout')
+            raise UpstreamTimeout(f'{ticker.ticker}: snapshot did not finish in time') from None
+        datasets = {}
+        for result in results:
+            datasets.update(result)
+        return cls(symbol=ticker.ticker, **datasets)
+
+    def chart_history(self):
+        # the candlestick only shows the last few months, no need to download them separately
+        if self.history.empty:
+            return self.history
+        start = self.history.index[-1] - pd.DateOffset(months=CHART_MONTHS)
+        return self.history[self.history.index > start]
+
+
+def upstream_executor():
+    # bounded pool shared by all requests of the worker process
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.UPSTREAM_MAX_WORKERS, thread_name_prefix='upstream')
+        return _executor
+
+
+async def run_upstream(name, func, *args):
+    # yfinance is blocking, so the call runs on the upstream pool and is awaited with a timeout
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(upstream_executor(), in_context(func), *args), settings.UPSTREAM_CALL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise UpstreamTimeout(f'{name} did not finish in time') from None
+
+
+def upstream_call(name):
+    # runs the call through upstream.call, times it as stage fetch_<name> and counts its failures
+    def decorator(func):
+        @wraps(func)
+        def timed(*args):
+            with span(f'fetch_{name}'):
+                try:
+                    return upstream.call(func, *args)
+                except Exception as e:
+                    increment('valuatio_upstream_errors_total', call=name, error=type(e).__name__)
+                    raise
+        return timed
+    return decorator
+
+
+@upstream_call('fundamentals')
+def fetch_fundamentals(ticker, timeout):
+    # a symbol without the basic quote data fails before its statements are downloaded, every
+    # page download gets `timeout` seconds through the session of the ticker
+    set_timeout(ticker, timeout)
+    datasets = {'info': ticker.info}
+    check_info(ticker.ticker, datasets['info'])
+    datasets.update((name, getattr(ticker, name)) for name in FUNDAMENTAL_DATASETS if name not in datasets)
+    check_statements(ticker.ticker, datasets)
+    return datasets
+
+
+@upstream_call('history')
+def fetch_history(ticker, timeout):
+    # the history carries the dividends as well, same as ticker.dividends reads them
+    history = checked_history(ticker.ticker, ticker.history(period=HISTORY_PERIOD, interval='1d', timeout=timeout))
+    if 'Dividends' in history:
+        dividends = history['Dividends'][history['Dividends'] != 0]
+    else:
+        dividends = pd.Series(dtype=float)
+    return {'history': history, 'dividends': dividends}
+
+
+def checked_history(symbol, history):
+    # yfinance returns no rows when the download failed, every listed symbol has prices
+    if history.empty:
+        raise EmptyResponse(f'{symbol}: no price history')
+    return history
+
+
+UPSTREAM_CALLS = {
+    'fundamentals': fetch_fundamentals,
+    'history': fetch_history,
+}
@@ -0,0 +1,81 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+from .values.math_constants import MILLION as M
+
+
+def split_ratios(history):
+    # the splits of the price history by day, 4.0 for a 4-for-1 split, 0.25 for a 1-for-4 reverse split
+    if 'Stock Splits' not in history:
+        return pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+    splits = history['Stock Splits']
+    return splits[splits > 0]
+
+
+def fiscal_year_end(balance_sheet):
+    # day the fiscal year ends, from the date of the latest annual balance sheet, None if it has none
+    dates = pd.to_datetime(balance_sheet.columns, errors='coerce').dropna()
+    return dates.max() if len(dates) else None
+
+
+def period_ends(years, year_end=None):
+    # the end of each fiscal year, labelled with the calendar year it ends in (December without year_end)
+    month, day = (year_end.month, year_end.day) if year_end is not None else (12, 31)
+    return pd.DatetimeIndex([pd.Timestamp(year, month, min(day, calendar.monthrange(year, month)[1]))
+                             for year in years])
+
+
+def split_factors(splits, years, year_end=None):
+    """Shares of today one share held at the end of each fiscal year of ``years`` has become, by year.
+
+    That is the product of the ratios of all splits after the end of the fiscal year, a reverse
+    cumulative product over the splits looked up for the end dates of every year at once.
+    """
+    splits = splits.sort_index()
+    dates = splits.index.tz_localize(None) if splits.index.tz is not None else splits.index
+    later = np.append(np.cumprod(splits.to_numpy()[::-1])[::-1], 1.0)
+    return pd.Series(later[dates.searchsorted(period_ends(years, year_end), side='right')], index=years,
+                     dtype=float)
+
+
+def adjusted_shares(shares, splits, current_shares, years, year_end=None):
+    """Shares outstanding in millions at the end of each of ``years``, counted in shares of today.
+
+    Years without a reported count take the next year's, failing that the previous year's.
+    Without reported counts every year gets ``current_shares``, in millions as well.
+    """
+    years = list(years)
+    if shares is None or shares.empty:
+        return pd.Series(current_shares, index=years, dtype=float)
+    reported = shares['BasicShares'] / M
+    adjusted = reported * split_factors(splits, list(reported.index), year_end)
+    every_year = sorted(set(years) | set(adjusted.index))
+    return adjusted.reindex(every_year).bfill().ffill().reindex(years)
+
+
+def earnings_per_share(earnings, shares):
+    # yearly earnings over the adjusted shares in millions, per share of today
+    return earnings / shares / M
+
+
+def median_prices(history, years):
+    # Yahoo adjusts the closes for later splits already, NaN for years without prices
+    close = history['Close']
+    return close.groupby(close.index.year).median().reindex(years)
+
+
+def adjusted_history(history, shares, current_shares, earnings, years, year_end=None):
+    """Split-adjusted shares, EPS and median price of each of ``years``, as one frame by year.
+
+    Everything comes from the one price history of the snapshot, its splits included. Shares
+    are adjusted for the splits after the end of each fiscal year, see ``fiscal_year_end``.
+    """
+    years = list(years)
+    shares = adjusted_shares(shares, split_ratios(history), current_shares, years, year_end)
+    return pd.DataFrame({
+        'shares': shares,
+        'eps': earnings_per_share(earnings.reindex(years), shares),
+        'median_price': median_prices(history, years),
+    }, index=years)
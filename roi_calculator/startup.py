@@ -0,0 +1,25 @@
+import importlib
+
+from django.conf import settings
+from django.urls import get_resolver
+
+from .symbols import get_symbol_index
+
+
+def lazy_modules():
+    # heavy libraries imported on first use, by the configured data source and chart mode
+    modules = []
+    if settings.VALUATION_DATA_SOURCE == 'yfinance':
+        modules.append('yfinance')
+    if settings.CHART_MODE == 'inline':
+        modules += ['plotly.graph_objs', 'plotly.io']
+    return modules
+
+
+def preload():
+    # everything the first request would import or load, the URLconf with the views, the lazy
+    # modules and the symbol listing
+    get_resolver().url_patterns
+    get_symbol_index()
+    for module in lazy_modules():
+        importlib.import_module(module)
@@ -0,0 +1,30 @@
+// Fills the datalist of the ticker inputs with the listed symbols matching what was typed.
+(function () {
+    const suggestions = document.getElementById('symbol-suggestions');
+    if (!suggestions) {
+        return;
+    }
+    let pending = null;
+    document.querySelectorAll('input[list="symbol-suggestions"]').forEach((input) => {
+        input.addEventListener('input', () => {
+            clearTimeout(pending);
+            pending = setTimeout(() => {
+                const query = input.value.trim();
+                if (!query) {
+                    return;
+                }
+                fetch(suggestions.dataset.url + '?q=' + encodeURIComponent(query))
+                    .then((response) => response.json())
+                    .then((data) => {
+                        suggestions.replaceChildren(...data.symbols.map((match) => {
+                            const option = document.createElement('option');
+                            option.value = match.symbol;
+                            option.label = match.name;
+                            return option;
+                        }));
+                    })
+                    .catch(() => {});
+            }, 150);
+        });
+    });
+})();
@@ -0,0 +1,34 @@
+// Draws the daily candlestick from the OHLC data of chart.json,
+// same look as utils.candlestick renders it on the server.
+(function () {
+    const chart = document.getElementById('candlestick');
+    if (!chart) {
+        return;
+    }
+    const axis = {
+        showgrid: true,
+        gridwidth: 1,
+        gridcolor: '#6272a4',
+        color: '#f8f8f2',
+    };
+    fetch(chart.dataset.url)
+        .then((response) => response.json())
+        .then((ohlc) => {
+            Plotly.newPlot(chart, [{
+                type: 'candlestick',
+                x: ohlc.x,
+                open: ohlc.open,
+                high: ohlc.high,
+                low: ohlc.low,
+                close: ohlc.close,
+                increasing: { line: { color: '#50fa7b' } },
+                decreasing: { line: { color: '#ff5555' } },
+            }], {
+                xaxis: Object.assign({ rangeslider: { visible: false } }, axis),
+                yaxis: axis,
+                plot_bgcolor: '#21222C',
+                paper_bgcolor: '#21222C',
+                margin: { t: 50 },
+            }, { responsive: true });
+        });
+})();
@@ -0,0 +1,19 @@
+// Replaces the placeholders of the page shell with the sections rendered by the server,
+// all sections are requested at once and share one download of the statements.
+(function () {
+    document.querySelectorAll('[data-partial-url]').forEach((section) => {
+        fetch(section.dataset.partialUrl)
+            .then((response) => {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then((html) => {
+                section.outerHTML = html;
+            })
+            .catch(() => {
+                section.innerHTML = '<p class="text-center">This section could not be loaded.</p>';
+            });
+    });
+})();
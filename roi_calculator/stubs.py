@@ -0,0 +1,147 @@
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .prices import PERIODS
+from .snapshot import FUNDAMENTAL_DATASETS, TickerSnapshot
+
+BALANCE_SHEET_ROWS = {
+    'Total Assets': 350e9,
+    'Total Liab': 170e9,
+    'Total Stockholder Equity': 180e9,
+    'Long Term Debt': 100e9,
+    'Total Current Assets': 130e9,
+    'Total Current Liabilities': 120e9,
+    'Retained Earnings': 5e9,
+}
+FINANCIALS_ROWS = {
+    'Total Revenue': 360e9,
+    'Gross Profit': 150e9,
+    'Ebit': 105e9,
+    'Net Income': 90e9,
+}
+
+
+def synthetic_snapshot(symbol='STUB', seed=0):
+    """Deterministic TickerSnapshot shaped like the yfinance data, used by tests and load tests."""
+    rng = np.random.RandomState(seed)
+    scale = 1 + rng.uniform(-0.25, 0.25)
+    today = pd.Timestamp(date.today())
+    fiscal_yrs = [today.year - 4, today.year - 3, today.year - 2, today.year - 1]
+    annual_dates = [pd.Timestamp(year, 9, 30) for year in reversed(fiscal_yrs)]
+    quarterly_dates = [today.to_period('Q').start_time - pd.DateOffset(months=3 * i) for i in range(1, 5)]
+
+    def statement(rows, dates, growth):
+        return pd.DataFrame(
+            {day: {row: value * scale * growth ** -i for row, value in rows.items()} for i, day in enumerate(dates)},
+            columns=dates)
+
+    shares_outstanding = 16e9 * scale
+    earnings = pd.DataFrame({
+        'Revenue': [FINANCIALS_ROWS['Total Revenue'] * scale * 1.08 ** -i for i in range(3, -1, -1)],
+        'Earnings': [FINANCIALS_ROWS['Net Income'] * scale * 1.1 ** -i for i in range(3, -1, -1)],
+    }, index=pd.Index(fiscal_yrs, name='Year'))
+    quarterly_earnings = pd.DataFrame({
+        'Revenue': [earnings['Revenue'].iloc[-1] / 4] * 4,
+        'Earnings': [earnings['Earnings'].iloc[-1] / 4] * 4,
+    }, index=pd.Index([f'{i}Q{today.year - 1}' for i in range(1, 5)], name='Quarter'))
+    shares = pd.DataFrame({'BasicShares': [shares_outstanding * 1.02 ** i for i in range(3, -1, -1)]},
+                          index=pd.Index(fiscal_yrs, name='Year'))
+
+    days = pd.bdate_range(end=today, periods=5 * 252)
+    close = 150 * scale * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(days))))
+    spread = np.abs(rng.normal(0, 0.01, len(days))) * close
+    dividend_days = days[::63]
+    history = pd.DataFrame({
+        'Open': close + rng.uniform(-1, 1, len(days)) * spread,
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.randint(5e7, 1e8, len(days)),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=days.rename('Date'))
+    history.loc[dividend_days, 'Dividends'] = 0.22 * scale
+    dividends = history['Dividends'][history['Dividends'] != 0]
+
+    price = float(close[-1])
+    market_cap = price * shares_outstanding
+    info = {
+        'symbol': symbol,
+        'longName': f'{symbol} Synthetic Inc.',
+        'longBusinessSummary': f'{symbol} is a synthetic company used for testing.',
+        'country': 'United States',
+        'sector': 'Technology',
+        'currency': 'USD',
+        'regularMarketPrice': price,
+        'sharesOutstanding': shares_outstanding,
+        'marketCap': market_cap,
+        'freeCashflow': 0.25 * FINANCIALS_ROWS['Total Revenue'] * scale,
+        'pegRatio': 1.4 * scale,
+        'priceToSalesTrailing12Months': market_cap / (FINANCIALS_ROWS['Total Revenue'] * scale),
+        'priceToBook': market_cap / (BALANCE_SHEET_ROWS['Total Stockholder Equity'] * scale),
+        'debtToEquity': 170.0 * scale,
+        'quickRatio': 0.9 * scale,
+        'currentRatio': 1.1 * scale,
+        'dividendYield': 0.88 * 4 / price,
+        'lastDividendValue': 0.22 * scale,
+        'payoutRatio': 0.15 * scale,
+        'exDividendDate': int(dividends.index[-1].timestamp()),
+    }
+    return TickerSnapshot(
+        symbol=symbol,
+        info=info,
+        balancesheet=statement(BALANCE_SHEET_ROWS, annual_dates, 1.05),
+        quarterly_balancesheet=statement(BALANCE_SHEET_ROWS, quarterly_dates, 1.01),
+        financials=statement(FINANCIALS_ROWS, annual_dates, 1.08),
+        quarterly_financials=statement({k: v / 4 for k, v in FINANCIALS_ROWS.items()}, quarterly_dates, 1.02),
+        quarterly_cashflow=statement({
+            'Total Cash From Operating Activities': 30e9,
+            'Net Income': FINANCIALS_ROWS['Net Income'] / 4,
+        }, quarterly_dates, 1.02),
+        earnings=earnings,
+        quarterly_earnings=quarterly_earnings,
+        shares=shares,
+        dividends=dividends,
+        history=history,
+    )
+
+
+class SnapshotTicker:
+    """Stands in for yf.Ticker by replaying a TickerSnapshot, every upstream call sleeps for ``latency`` seconds.
+
+    Like yfinance, the first access to a fundamental dataset costs one call and the rest
+    are served from memory.
+    """
+
+    def __init__(self, snapshot, latency=0.0):
+        self.ticker = snapshot.symbol
+        self.latency = latency
+        self._snapshot = snapshot
+        self._fundamentals = False
+
+    def __getattr__(self, name):
+        if name not in FUNDAMENTAL_DATASETS:
+            raise AttributeError(name)
+        if not self._fundamentals:
+            time.sleep(self.latency)
+            self._fundamentals = True
+        return getattr(self._snapshot, name)
+
+    def history(self, period='1mo', interval='1d', timeout=None, start=None, **kwargs):
+        time.sleep(self.latency)
+        history = self._snapshot.history
+        if start is not None:
+            return history[history.index >= pd.Timestamp(start)]
+        return history[history.index > history.index[-1] - PERIODS[period]]
+
+
+class StubTicker(SnapshotTicker):
+    """Synthetic data for any symbol, used for load testing."""
+
+    def __init__(self, symbol, latency=0.0):
+        symbol = symbol.upper()
+        super().__init__(synthetic_snapshot(symbol, seed=zlib.crc32(symbol.encode())), latency)
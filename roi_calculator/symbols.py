@@ -0,0 +1,87 @@
+import csv
+import difflib
+import os
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+# sorts after every character of a symbol or name, closes a prefix range
+END = '\uffff'
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class SymbolIndex:
+    """Listed symbols and their names, in sorted lists searched by bisection.
+
+    Symbols are matched by prefix, names by the prefix of any of their words.
+    """
+
+    def __init__(self, listing, version=None):
+        listing = dict(listing)
+        # (path, mtime) of the listing file
+        self.version = version
+        self.symbols = sorted(listing)
+        self.names = [listing[symbol] for symbol in self.symbols]
+        # (word, position of the symbol) for every word of every name
+        self.words = sorted(
+            (word, i) for i, name in enumerate(self.names) for word in set(name.lower().split()))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        i = bisect_left(self.symbols, symbol)
+        return i < len(self.symbols) and self.symbols[i] == symbol
+
+    def complete(self, query, limit=10):
+        # (symbol, name) pairs, symbols starting with the query first, then names with a word starting with it
+        query = query.strip()
+        if not query:
+            return []
+        positions = list(range(*prefix_range(self.symbols, query.upper())))[:limit]
+        if len(positions) < limit:
+            start, end = prefix_range(self.words, (query.lower(),), (query.lower() + END,))
+            for _, i in self.words[start:end]:
+                if i not in positions:
+                    positions.append(i)
+                    if len(positions) == limit:
+                        break
+        return [(self.symbols[i], self.names[i]) for i in positions]
+
+    def suggest(self, symbol, limit=3):
+        # close matches for a typo, searched among the symbols with the same first letter only
+        start, end = prefix_range(self.symbols, symbol[:1])
+        return difflib.get_close_matches(symbol, self.symbols[start:end], n=limit, cutoff=0.6)
+
+
+def prefix_range(items, low, high=None):
+    # positions of the sorted items between low and high, by default the items starting with low
+    return bisect_left(items, low), bisect_left(items, high if high is not None else low + END)
+
+
+def read_listing(path):
+    # CSV with symbol and name columns, as written by `manage.py update_symbols`
+    with open(path, newline='') as f:
+        return [(row['symbol'].upper(), row['name']) for row in csv.DictReader(f)]
+
+
+def get_symbol_index():
+    # None without a listing file, loaded once per process and again when the file changes
+    global _index
+    path = settings.SYMBOL_LISTING_FILE
+    try:
+        version = (str(path), os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = SymbolIndex(read_listing(path), version)
+        return _index
+
+
+def is_checkable(symbol):
+    # the listing covers the US exchanges, symbols with an exchange suffix (SAP.DE) are not in it
+    return '.' not in symbol
@@ -1,3 +1,804 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import requests
+from asgiref.sync import async_to_sync
+from django.contrib.staticfiles import finders
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    api, archive, cache, conditional, failures, metrics, popularity, prewarm, projection, relative, screener,
+    singleflight, splits, upstream)
+from .management.commands.importtime import import_times
+from .management.commands.update_symbols import parse_directory
+from .failures import CannotValue
+from .models import CachedFundamentals, FailedSymbol, RefreshJob
+from .prices import PriceStore, StoredHistoryTicker, to_bars
+from .providers import FixtureNotFound, upstream_ticker
+from .scoring import NOT_AVAILABLE, ScoringModel, get_scoring_model, score_frame
+from .startup import lazy_modules
+from .snapshot import FUNDAMENTAL_DATASETS, TickerSnapshot, UpstreamTimeout, fetch_history
+from .stubs import StubTicker, synthetic_snapshot
+from .symbols import SymbolIndex
+from .utils import (
+    return_on_investment, seven_yrs_overview, stock_overall_score, stock_scoring, valuation_dictionary)
+
+
+class CachedFundamentalsTests(TestCase):
+    def store(self, age, statements_age=None):
+        now = timezone.now()
+        return CachedFundamentals.objects.create(
+            symbol='AAPL',
+            fundamentals={'symbol': 'AAPL', 'eps': 6.0, 'price': 150.0},
+            data_saved_on=now - age,
+            statements_saved_on=now - (statements_age if statements_age is not None else age),
+        )
+
+    @override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0)
+    def test_miss_computes_and_stores(self):
+        fundamentals, snapshot = cache.load('aapl')
+        self.assertEqual(fundamentals['symbol'], 'AAPL')
+        self.assertEqual(snapshot.symbol, 'AAPL')
+        self.assertIn('data_saved_on', fundamentals)
+        self.assertTrue(CachedFundamentals.objects.filter(symbol='AAPL').exists())
+
+    @override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0)
+    def test_async_miss_computes_and_stores(self):
+        fundamentals, snapshot = async_to_sync(cache.aload)('msft')
+        self.assertEqual(fundamentals['symbol'], 'MSFT')
+        self.assertEqual(cache.get_fundamentals('MSFT')['data_saved_on'], fundamentals['data_saved_on'])
+
+    def test_nan_is_stored_as_null(self):
+        cache.store_fundamentals('AAPL', {'symbol': 'AAPL', 'eps': np.float64('nan'), 'f_score': np.int64(5)})
+        entry = CachedFundamentals.objects.get(symbol='AAPL')
+        self.assertEqual(entry.fundamentals, {'symbol': 'AAPL', 'eps': None, 'f_score': 5})
+
+    @mock.patch.object(cache, 'refresh_in_background')
+    @mock.patch.object(cache, 'valuation_dictionary')
+    def test_fresh_entry_is_served_from_db(self, valuation_dictionary, refresh_in_background):
+        entry = self.store(timedelta(minutes=1))
+        fundamentals = cache.get_fundamentals('AAPL')
+        self.assertEqual(fundamentals['data_saved_on'], entry.data_saved_on)
+        valuation_dictionary.assert_not_called()
+        refresh_in_background.assert_not_called()
+
+    @mock.patch.object(cache, 'refresh_in_background')
+    @mock.patch.object(cache, 'valuation_dictionary')
+    def test_stale_statements_are_served_and_revalidated(self, valuation_dictionary, refresh_in_background):
+        self.store(timedelta(days=2))
+        fundamentals = cache.get_fundamentals('AAPL')
+        self.assertEqual(fundamentals['price'], 150.0)
+        valuation_dictionary.assert_not_called()
+        refresh_in_background.assert_called_once_with('AAPL', cache.refresh_fundamentals)
+
+    @override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0)
+    def test_expired_quote_refreshes_only_info(self):
+        self.store(timedelta(hours=2), statements_age=timedelta(hours=3))
+        fundamentals = cache.get_fundamentals('AAPL')
+        self.assertNotEqual(fundamentals['price'], 150.0)
+        self.assertEqual(fundamentals['pe_ratio'], fundamentals['price'] / 6.0)
+        self.assertEqual(fundamentals['symbol'], 'AAPL')
+
+
+class CountingTicker:
+    ticker = 'STUB'
+    # like yf.Ticker without a session of its own
+    session = None
+
+    def __init__(self, snapshot, delay=0):
+        self.snapshot = snapshot
+        self.delay = delay
+        self.accessed = []
+
+    def __getattr__(self, name):
+        self.accessed.append(name)
+        return getattr(self.snapshot, name)
+
+    def history(self, **kwargs):
+        self.accessed.append('history')
+        time.sleep(self.delay)
+        return self.snapshot.history
+
+
+class TickerSnapshotTests(TestCase):
+    def test_fetch_reads_every_dataset_once(self):
+        ticker = CountingTicker(synthetic_snapshot())
+        snapshot = TickerSnapshot.fetch(ticker)
+        self.assertEqual(sorted(ticker.accessed), sorted(FUNDAMENTAL_DATASETS + ('history',)))
+        self.assertEqual(snapshot.symbol, 'STUB')
+        self.assertEqual(len(snapshot.dividends), len(ticker.snapshot.dividends))
+
+    @override_settings(UPSTREAM_CALL_TIMEOUT=0.05)
+    def test_fetch_raises_when_upstream_call_times_out(self):
+        with self.assertRaises(UpstreamTimeout):
+            TickerSnapshot.fetch(CountingTicker(synthetic_snapshot(), delay=0.5))
+
+    def test_chart_history_is_sliced_from_history(self):
+        snapshot = synthetic_snapshot()
+        chart_history = snapshot.chart_history()
+        self.assertLess(len(chart_history), 70)
+        self.assertEqual(chart_history.index[-1], snapshot.history.index[-1])
+
+    def test_valuation_from_recorded_snapshot(self):
+        fundamentals = valuation_dictionary(synthetic_snapshot('AAPL'))
+        self.assertEqual(fundamentals['symbol'], 'AAPL')
+        self.assertAlmostEqual(fundamentals['pe_ratio'], fundamentals['price'] / fundamentals['eps'])
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'symbol': 'AAPL'}
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(lambda _: singleflight.do('test-AAPL', compute), range(5)))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_async_calls_share_one_execution(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 42
+
+        async def run():
+            return await asyncio.gather(*(singleflight.ado('test-async', compute) for _ in range(5)))
+
+        self.assertEqual(async_to_sync(run)(), [42] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_file_lock_is_exclusive(self):
+        first, second = singleflight.FileLock('test-lock'), singleflight.FileLock('test-lock')
+        self.assertTrue(first.acquire(timeout=1))
+        self.assertFalse(second.acquire(timeout=0.1))
+        first.release()
+        self.assertTrue(second.acquire(timeout=1))
+        second.release()
+
+
+class ScoringModelTests(TestCase):
+    def test_scores_match_benchmarks(self):
+        score = stock_scoring(dict.fromkeys(get_scoring_model().metrics, None) | {
+            'debt_to_equity': 1.0, 'pe_ratio': 40.1, 'f_score': 5, 'z_score': 1.4,
+            'dividend_yield': None, 'payout_ratio': 0.3, 'pb_ratio': -1.0,
+        })
+        self.assertEqual(score['debt_to_equity'], ((100, 'score-100'), 3.0))
+        self.assertEqual(score['pe_ratio'][0], (0, 'score-na'))
+        self.assertEqual(score['f_score'][0], (60, 'score-60'))
+        self.assertEqual(score['z_score'][0], (0, 'score-na'))
+        self.assertEqual(score['payout_ratio'][0], (0, 'score-na'))
+        self.assertEqual(score['pb_ratio'][0], (0, 'score-na'))
+        self.assertEqual(score['roe'][0], (0, 'score-na'))
+
+    def test_new_metric_only_needs_an_ini_section(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ini') as ini:
+            ini.write('[ps_ratio]\ndirection = lower\nbm1 = 1\nbm2 = 2\nbm3 = 3\nbm4 = 4\nbm5 = 5\nweight = 1\n')
+            ini.flush()
+            model = ScoringModel(ini.name)
+        self.assertEqual(model.score({'ps_ratio': 2.5}), {'ps_ratio': ((60, 'score-60'), 1.0)})
+
+    def test_batch_scores_match_scalar_scores(self):
+        rows = [
+            valuation_dictionary(synthetic_snapshot('AAPL')),
+            dict(valuation_dictionary(synthetic_snapshot('KO', seed=3)), dividend_yield=None, pe_ratio=-3.0),
+            dict.fromkeys(get_scoring_model().metrics, None),
+        ]
+        batch = score_frame(pd.DataFrame(rows))
+        for i, fundamentals in enumerate(rows):
+            scores = stock_scoring(fundamentals)
+            for metric, ((score, class_name), _) in scores.items():
+                self.assertEqual((batch[f'{metric}_score'][i], batch[f'{metric}_class'][i]), (score, class_name))
+            overall = stock_overall_score(scores) or (0.0, None)
+            self.assertEqual((batch['overall_score'][i], batch['overall_class'][i]), overall)
+
+
+class RawArchiveTests(TestCase):
+    def test_archived_snapshot_replays_to_the_same_valuation(self):
+        snapshot = synthetic_snapshot('AAPL')
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with override_settings(RAW_ARCHIVE_DIR=archive_dir):
+                archive.archive_snapshot(snapshot)
+                archive.flush()
+            replayed = archive.read_snapshot(archive.snapshot_dir(archive_dir, 'AAPL', date.today()))
+        expected = valuation_dictionary(snapshot)
+        actual = valuation_dictionary(replayed)
+        del expected['data_saved_on'], actual['data_saved_on']
+        self.assertEqual(actual, expected)
+
+
+class PriceStoreTests(TestCase):
+    def test_store_only_downloads_missing_bars(self):
+        upstream = StubTicker('AAPL')
+        upstream.history = mock.Mock(wraps=upstream.history)
+        with tempfile.TemporaryDirectory() as store_dir:
+            store = PriceStore(store_dir)
+            ticker = StoredHistoryTicker(upstream, store)
+            history = ticker.history(period='5y', interval='1d')
+            chart = ticker.history(period='3mo', interval='1d')
+            self.assertEqual(upstream.history.call_count, 1)
+            os.utime(store.path('AAPL'), (0, 0))
+            updated = ticker.history(period='5y', interval='1d')
+        last_day = str(history.index[-1].date())
+        upstream.history.assert_called_with(start=last_day, interval='1d', timeout=None)
+        expected = upstream._snapshot.history
+        np.testing.assert_array_equal(history['Close'], expected['Close'])
+        np.testing.assert_array_equal(chart.index, expected.index[-len(chart):])
+        pd.testing.assert_frame_equal(updated, history)
+
+    def test_dividend_in_new_bars_downloads_everything_again(self):
+        upstream = StubTicker('AAPL')
+        history = upstream._snapshot.history.copy()
+        history.loc[history.index[-2], 'Dividends'] = 0.25
+        # the closes before the dividend as Yahoo adjusts them afterwards
+        history.loc[history.index[:-2], 'Close'] *= 0.99
+        upstream.history = mock.Mock(side_effect=lambda period=None, start=None, **kwargs: (
+            history[history.index >= pd.Timestamp(start)] if start else history))
+        with tempfile.TemporaryDirectory() as store_dir:
+            store = PriceStore(store_dir)
+            store.write('AAPL', to_bars(upstream._snapshot.history[:-5]))
+            os.utime(store.path('AAPL'), (0, 0))
+            bars = store.update(upstream)
+        upstream.history.assert_called_with(period='5y', interval='1d', timeout=None)
+        np.testing.assert_array_equal(bars['Close'], history['Close'])
+
+    def test_yearly_medians(self):
+        snapshot = synthetic_snapshot()
+        years = sorted(set(snapshot.history.index.year))
+        medians = splits.median_prices(snapshot.history, years + [1990])
+        for year in years:
+            self.assertEqual(medians[year], snapshot.history.loc[str(year), 'Close'].median())
+        self.assertTrue(np.isnan(medians[1990]))
+
+
+class SplitAdjustmentTests(TestCase):
+    def test_factors_multiply_the_later_splits(self):
+        ratios = pd.Series([4.0, 2.0], index=pd.to_datetime(['2020-08-31', '2022-06-06']))
+        self.assertEqual(splits.split_factors(ratios, [2019, 2020, 2021, 2022]).tolist(), [8, 2, 2, 1])
+        shares = pd.DataFrame({'BasicShares': [100e6, 400e6]}, index=[2019, 2021])
+        # 2020 is missing and takes the count of 2021, in millions once
+        self.assertEqual(splits.adjusted_shares(shares, ratios, 700, [2019, 2020, 2021]).tolist(), [800, 800, 800])
+
+    def test_splits_count_from_the_end_of_the_fiscal_year(self):
+        # Apple's fiscal year ends in September, a November split comes after the shares of that year
+        ratios = pd.Series([2.0], index=pd.to_datetime(['2021-11-15']))
+        year_end = splits.fiscal_year_end(pd.DataFrame(columns=pd.to_datetime(['2021-09-25', '2020-09-26'])))
+        self.assertEqual(splits.split_factors(ratios, [2020, 2021, 2022], year_end).tolist(), [2, 2, 1])
+        self.assertEqual(splits.split_factors(ratios, [2020, 2021, 2022]).tolist(), [2, 1, 1])
+
+    def test_valuation_is_the_same_after_a_split(self):
+        snapshot = synthetic_snapshot()
+        years = list(snapshot.shares.index)
+        history = snapshot.history.copy()
+        history.loc[history.index[history.index.year == years[2]][0], 'Stock Splits'] = 4.0
+        # reported before the split, the prices and dividends of Yahoo are adjusted for it already
+        shares = snapshot.shares.copy()
+        shares.loc[years[:2], 'BasicShares'] /= 4
+        split = valuation_dictionary(snapshot._replace(history=history, shares=shares))
+        unsplit = valuation_dictionary(snapshot)
+        for key in ('pe_ratio_median', 'payout_ratio_median'):
+            self.assertAlmostEqual(split[key], unsplit[key])
+
+
+@override_settings(RELATIVE_MIN_PEERS=5)
+class RelativeScoringTests(TestCase):
+    def setUp(self):
+        relative._index = None
+        self.index = relative.PercentileIndex([('roe', True), ('ps_ratio', False)])
+        for i in range(10):
+            self.index.update(f'T{i}', {'sector': 'Technology', 'country': 'United States',
+                                        'roe': float(i + 1), 'ps_ratio': float(i + 1)})
+
+    def tearDown(self):
+        relative._index = None
+
+    def test_values_are_ranked_against_their_peers(self):
+        values = self.index.peers({'sector': 'Technology', 'country': 'United States'}, 'roe')
+        self.assertEqual(values, [float(i + 1) for i in range(10)])
+        self.assertEqual(self.index.beaten(values, 9.5, True), 0.9)
+        self.assertEqual(self.index.beaten(values, 2.5, False), 0.8)
+        # too few peers in Germany, the sector is used
+        self.index.update('SAP', {'sector': 'Technology', 'country': 'Germany', 'roe': 11.0})
+        self.assertEqual(len(self.index.peers({'sector': 'Technology', 'country': 'Germany'}, 'roe')), 11)
+        self.assertIsNone(self.index.peers({'sector': 'Energy', 'country': 'Germany'}, 'pb_ratio'))
+
+    def test_refreshed_ticker_replaces_its_values(self):
+        self.index.update('T0', {'sector': 'Technology', 'country': 'United States', 'roe': 20.0, 'ps_ratio': -1})
+        group = ('sector', 'Technology')
+        self.assertEqual(self.index.values[group, 'roe'][-1], 20.0)
+        self.assertEqual(len(self.index.values[group, 'roe']), 10)
+        self.assertEqual(len(self.index.values[group, 'ps_ratio']), 9)
+
+    @override_settings(SCORING_MODE='relative', VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0, RELATIVE_MIN_PEERS=2)
+    def test_relative_mode_scores_the_price_to_sales_ratio(self):
+        # without peers there is no benchmark for it
+        self.assertEqual(stock_scoring(cache.get_fundamentals('AAPL'))['ps_ratio'][0], NOT_AVAILABLE)
+        cheapest = min((cache.get_fundamentals(symbol) for symbol in ('AAPL', 'MSFT', 'KO')),
+                       key=lambda fundamentals: fundamentals['ps_ratio'])
+        relative._index = None
+        scores = stock_scoring(cheapest)
+        # cheaper than two of three peers
+        self.assertEqual(scores['ps_ratio'][0], (60, 'score-60'))
+        self.assertEqual(set(scores), set(get_scoring_model().metrics) | {'ps_ratio'})
+
+
+class ProjectionTests(TestCase):
+    def test_single_scenario_matches_scalar_projection(self):
+        for seed in range(5):
+            fundamentals = valuation_dictionary(synthetic_snapshot(seed=seed))
+            expected = return_on_investment(fundamentals, seven_yrs_overview(fundamentals))
+            actual = projection.project(
+                fundamentals['tse_per_share'], fundamentals['roe'], fundamentals['roe_median'],
+                fundamentals['payout_ratio_median'], fundamentals['pe_ratio_median'], fundamentals['price'])
+            self.assertEqual(float(actual), expected['expected_yearly_return'])
+
+    def test_return_bands(self):
+        fundamentals = valuation_dictionary(synthetic_snapshot())
+        bands = projection.return_bands(fundamentals, count=100_000)
+        self.assertEqual(list(bands), ['p5', 'p25', 'p50', 'p75', 'p95'])
+        self.assertLess(bands['p5'], bands['p50'])
+        self.assertLess(bands['p50'], bands['p95'])
+        expected = return_on_investment(fundamentals, seven_yrs_overview(fundamentals))['expected_yearly_return']
+        self.assertAlmostEqual(bands['p50'], expected, delta=0.02)
+        self.assertIsNone(projection.return_bands(dict(fundamentals, roe=None)))
+
+
+@override_settings(STUB_LATENCY=0)
+class FixtureProviderTests(TestCase):
+    def test_recorded_fixture_replays_to_the_same_valuation(self):
+        with tempfile.TemporaryDirectory() as fixture_dir:
+            call_command('record_fixtures', 'aapl', dir=fixture_dir, source='stub', stdout=mock.Mock())
+            with override_settings(VALUATION_DATA_SOURCE='fixtures', FIXTURE_DIR=fixture_dir):
+                replayed = TickerSnapshot.fetch(upstream_ticker('AAPL'))
+                with self.assertRaises(FixtureNotFound):
+                    upstream_ticker('MSFT')
+            with override_settings(VALUATION_DATA_SOURCE='stub'):
+                recorded = TickerSnapshot.fetch(upstream_ticker('AAPL'))
+        expected = valuation_dictionary(recorded)
+        actual = valuation_dictionary(replayed)
+        del expected['data_saved_on'], actual['data_saved_on']
+        self.assertEqual(actual, expected)
+
+
+@override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0, CHART_MODE='static', PROGRESSIVE_RENDERING=0)
+class ChartTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_ticker_page_loads_chart_separately(self):
+        response = self.client.get('/ticker/AAPL/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/static/plotly/plotly.min.js?v=')
+        self.assertContains(response, '/ticker/AAPL/chart.json')
+        self.assertLess(len(response.content), 100_000)
+
+    def test_chart_data_is_cached_by_the_valuation(self):
+        self.client.get('/ticker/AAPL/')
+        with mock.patch('roi_calculator.charts.chart_history') as chart_history:
+            response = self.client.get('/ticker/AAPL/chart.json')
+        chart_history.assert_not_called()
+        ohlc = response.json()
+        self.assertEqual(set(ohlc), {'x', 'open', 'high', 'low', 'close'})
+        self.assertEqual(len(ohlc['x']), len(ohlc['close']))
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_plotly_js_is_found(self):
+        self.assertTrue(finders.find('plotly/plotly.min.js').endswith('plotly.min.js'))
+
+
+@override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0, PROGRESSIVE_RENDERING=1)
+class ProgressiveRenderingTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('roi_calculator.cache.refresh_in_background')
+        self.refresh_in_background = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cold_symbol_serves_shell_and_starts_refresh(self):
+        response = self.client.get('/ticker/AAPL/')
+        self.assertContains(response, 'AAPL Synthetic Inc.')
+        self.assertContains(response, '/ticker/AAPL/sections/fundamentals/')
+        self.assertContains(response, '/ticker/AAPL/sections/long_term/')
+        self.assertNotContains(response, 'Score:')
+        self.refresh_in_background.assert_called_once_with('AAPL', cache.refresh_fundamentals)
+
+    def test_sections_render_fragments_and_warm_page(self):
+        response = self.client.get('/ticker/AAPL/sections/score/')
+        self.assertContains(response, 'Score:')
+        self.assertNotContains(response, '<html')
+        response = self.client.get('/ticker/AAPL/')
+        self.assertContains(response, 'Score:')
+        self.assertNotContains(response, 'data-partial-url')
+        self.assertEqual(self.client.get('/ticker/AAPL/sections/chart/').status_code, 404)
+
+    def test_each_view_is_one_lookup(self):
+        popularity._hits.clear()
+        prewarm.track(['AAPL'])
+        self.client.get('/ticker/AAPL/')
+        cache.load('AAPL')
+        self.client.get('/ticker/AAPL/')
+        self.assertEqual(popularity._hits['AAPL'], 3)
+
+
+def screened_fundamentals(symbol):
+    if symbol == 'BAD':
+        raise KeyError('regularMarketPrice')
+    return valuation_dictionary(synthetic_snapshot(symbol))
+
+
+@mock.patch('roi_calculator.screener.get_fundamentals', screened_fundamentals)
+class ScreenerTests(TestCase):
+    def test_parse_symbols(self):
+        self.assertEqual(screener.parse_symbols(' aapl, MSFT\nAAPL;goog '), ['AAPL', 'MSFT', 'GOOG'])
+
+    def test_failures_are_reported_per_row(self):
+        response = self.client.get('/screener/?symbols=AAPL,BAD,MSFT')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        rows = {row['symbol']: row for row in rows}
+        self.assertEqual(set(rows), {'AAPL', 'BAD', 'MSFT'})
+        self.assertIn('KeyError', rows['BAD']['error'])
+        self.assertIsNone(rows['AAPL']['error'])
+        self.assertEqual(rows['AAPL']['name'], 'AAPL Synthetic Inc.')
+
+    def test_csv_format(self):
+        response = self.client.get('/screener/?symbols=AAPL&format=csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), list(screener.FIELDS))
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(self.client.get('/screener/?symbols=AAPL&format=xml').status_code, 400)
+
+
+@override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0, CHART_MODE='static', PROGRESSIVE_RENDERING=0,
+                   METRICS_ENABLED=1)
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_ticker_view_reports_server_timing(self):
+        response = self.client.get('/ticker/AAPL/')
+        stages = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        for stage in ('load', 'fetch_fundamentals', 'fetch_history', 'valuation', 'f_score', 'z_score',
+                      'overview', 'scoring', 'render', 'total'):
+            self.assertIn(stage, stages)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/ticker/AAPL/')
+        self.client.get('/ticker/AAPL/')
+        ticker = StubTicker('BAD', latency=0)
+        with mock.patch.object(ticker, 'history', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            TickerSnapshot.fetch(ticker)
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('valuatio_cache_lookups_total{cache="fundamentals",result="miss"} 1', text)
+        self.assertIn('valuatio_cache_lookups_total{cache="fundamentals",result="hit"} 1', text)
+        self.assertIn('valuatio_upstream_errors_total{call="history",error="RuntimeError"} 1', text)
+        self.assertIn('valuatio_stage_seconds_bucket{stage="f_score",le="+Inf"} 1', text)
+        self.assertIn('valuatio_request_seconds_count{view="roi_calculator-ticker_view"} 2', text)
+
+    @override_settings(METRICS_ENABLED=0)
+    def test_metrics_are_opt_in(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.assertFalse(self.client.get('/ticker/AAPL/').has_header('Server-Timing'))
+
+
+@override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0, PROGRESSIVE_RENDERING=0)
+class ConditionalGetTests(TestCase):
+    def test_unchanged_valuation_answers_not_modified(self):
+        self.assertFalse(self.client.get('/ticker/AAPL/').has_header('ETag'))
+        first = self.client.get('/ticker/AAPL/')
+        self.assertIn('public', first['Cache-Control'])
+        with mock.patch('roi_calculator.views.load') as load:
+            response = self.client.get('/ticker/AAPL/', HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get('/ticker/AAPL/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+        load.assert_not_called()
+
+    def test_refresh_changes_etag(self):
+        self.client.get('/ticker/AAPL/')
+        first = self.client.get('/ticker/AAPL/')
+        CachedFundamentals.objects.filter(symbol='AAPL').update(data_saved_on=timezone.now() + timedelta(seconds=1))
+        response = self.client.get('/ticker/AAPL/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_not_modified_revalidates_a_stale_entry(self):
+        cache.load('AAPL')
+        ttl = settings.VALUATION_CACHE_TTL['quote'][0]
+        CachedFundamentals.objects.filter(symbol='AAPL').update(
+            data_saved_on=timezone.now() - timedelta(seconds=ttl + 1))
+        etag = conditional.validators('AAPL')[0]
+        with mock.patch('roi_calculator.conditional.refresh_in_background') as refresh_in_background:
+            response = self.client.get('/ticker/AAPL/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        refresh_in_background.assert_called_once_with('AAPL', cache.refresh_quote)
+
+    def test_cacheable_page_sets_no_cookie(self):
+        self.client.get('/ticker/AAPL/')
+        response = self.client.get('/ticker/AAPL/')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertFalse(response.cookies)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        # a strong ETag, every visitor gets the same bytes
+        self.assertEqual(self.client_class().get('/ticker/AAPL/').content, response.content)
+        # the navigation bar searches with GET
+        self.assertRedirects(self.client.get('/', {'ticker': 'msft'}), '/ticker/MSFT/', fetch_redirect_response=False)
+
+    def test_posts_get_no_validators(self):
+        self.client.get('/ticker/AAPL/')
+        response = self.client.post('/ticker/AAPL/', {'ticker': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(UPSTREAM_RETRIES=2, UPSTREAM_BACKOFF=0, UPSTREAM_BREAKER_THRESHOLD=2,
+                   UPSTREAM_BREAKER_COOLDOWN=60)
+class UpstreamClientTests(TestCase):
+    def setUp(self):
+        upstream._breakers.clear()
+
+    def test_transient_failures_are_retried(self):
+        call = mock.Mock(side_effect=[requests.ConnectionError(), upstream.EmptyResponse(), 'info'])
+        self.assertEqual(upstream.call(call), 'info')
+        self.assertEqual(call.call_count, 3)
+
+    def test_breaker_opens_after_failed_calls(self):
+        failing = mock.Mock(side_effect=requests.ConnectionError())
+        for _ in range(2):
+            with self.assertRaises(upstream.UpstreamUnavailable):
+                upstream.call(failing)
+        self.assertEqual(failing.call_count, 6)
+        with self.assertRaises(upstream.UpstreamUnavailable):
+            upstream.call(failing)
+        self.assertEqual(failing.call_count, 6)
+        # other errors, like bugs or incomplete data, neither count nor reset the failures
+        upstream._breakers.clear()
+        with self.assertRaises(upstream.UpstreamUnavailable):
+            upstream.call(failing)
+        with self.assertRaises(KeyError):
+            upstream.call(mock.Mock(side_effect=KeyError('regularMarketPrice')))
+        self.assertTrue(upstream.circuit_breaker().allow())
+        with self.assertRaises(upstream.UpstreamUnavailable):
+            upstream.call(failing)
+        self.assertFalse(upstream.circuit_breaker().allow())
+
+    def test_session_adds_the_call_timeout(self):
+        session = upstream.TimeoutSession()
+        upstream.set_timeout(mock.Mock(session=session), 3)
+        with mock.patch('requests.Session.send') as send:
+            session.get('https://finance.yahoo.com/quote/AAPL')
+            session.get('https://query2.finance.yahoo.com/v8/finance/chart/AAPL', timeout=1)
+        self.assertEqual([call.kwargs['timeout'] for call in send.call_args_list], [3, 1])
+
+    def test_empty_history_is_an_upstream_error(self):
+        ticker = StubTicker('AAPL')
+        with mock.patch.object(ticker, 'history', return_value=pd.DataFrame()), \
+                self.assertRaises(upstream.UpstreamUnavailable):
+            fetch_history(ticker, None)
+
+    def test_token_bucket(self):
+        bucket = upstream.TokenBucket(rate=10, burst=2)
+        self.assertEqual([bucket.take(), bucket.take()], [0, 0])
+        self.assertAlmostEqual(bucket.take(), 0.1, delta=0.01)
+        with self.assertRaises(upstream.UpstreamUnavailable):
+            bucket.acquire(timeout=0.01)
+
+    @override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0)
+    def test_expired_entry_is_served_while_upstream_is_unavailable(self):
+        fundamentals = cache.load('AAPL')[0]
+        CachedFundamentals.objects.filter(symbol='AAPL').update(
+            statements_saved_on=timezone.now() - timedelta(days=30))
+        with mock.patch('roi_calculator.cache.TickerSnapshot.fetch', side_effect=upstream.UpstreamUnavailable):
+            served, snapshot = cache.load('AAPL')
+        self.assertIsNone(snapshot)
+        self.assertEqual(served['price'], fundamentals['price'])
+
+
+@override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0)
+class ApiTests(TestCase):
+    def test_valuation_fields_can_be_selected(self):
+        response = self.client.get('/api/v1/valuation/aapl', {'fields': 'price,roi,score'})
+        self.assertEqual(response.status_code, 200)
+        valuation = response.json()
+        self.assertEqual(set(valuation), {'version', 'symbol', 'data_saved_on', 'price', 'roi', 'score'})
+        self.assertEqual(valuation['price'], cache.get_fundamentals('AAPL')['price'])
+        response = self.client.get('/api/v1/valuation/aapl', {'exclude': 'description'})
+        self.assertNotIn('description', response.json())
+        self.assertIn('overview', response.json())
+
+    def test_only_symbols_which_cannot_be_valued_are_not_found(self):
+        failures.record_failure('XXXX', 'no marketCap in the quote data')
+        response = self.client.get('/api/v1/valuation/xxxx')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['error'], 'XXXX: cannot be valued (no marketCap in the quote data)')
+        with mock.patch('roi_calculator.api.get_fundamentals', side_effect=KeyError('price')), \
+                self.assertRaises(KeyError):
+            self.client.get('/api/v1/valuation/aapl')
+
+    def test_batch_keeps_the_order_and_reports_errors_per_symbol(self):
+        # loaded here, pool threads would write to the database outside of the test transaction
+        fundamentals = {symbol: cache.get_fundamentals(symbol) for symbol in ('MSFT', 'AAPL')}
+        with mock.patch('roi_calculator.api.get_fundamentals', side_effect=lambda symbol: fundamentals[symbol]):
+            response = self.client.get('/api/v1/valuations', {'symbols': 'msft,fail,aapl', 'fields': 'price'})
+        valuations = response.json()['valuations']
+        self.assertEqual([valuation['symbol'] for valuation in valuations], ['MSFT', 'FAIL', 'AAPL'])
+        self.assertEqual(valuations[1]['error'], "KeyError: 'FAIL'")
+        self.assertEqual(self.client.get('/api/v1/valuations').status_code, 400)
+
+    def test_nan_and_numpy_values_are_json_compatible(self):
+        self.assertEqual(api.compact({'a': [np.float64('nan'), np.int64(3)], 'b': (float('inf'),)}),
+                         {'a': [None, 3], 'b': [None]})
+
+
+@override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0)
+class PrewarmTests(TestCase):
+    def test_plan_orders_by_staleness_and_popularity(self):
+        prewarm.track(['NEW', 'QUIET', 'POPULAR', 'FRESH'])
+        for symbol in ('QUIET', 'POPULAR', 'FRESH'):
+            cache.load(symbol)
+        RefreshJob.objects.filter(symbol='POPULAR').update(hits=10)
+        CachedFundamentals.objects.filter(symbol__in=['QUIET', 'POPULAR']).update(
+            data_saved_on=timezone.now() - timedelta(hours=1))
+        planned = prewarm.plan(timezone.now(), timedelta(0))
+        self.assertEqual([(job.symbol, refresh) for job, refresh in planned], [
+            ('NEW', cache.refresh_fundamentals), ('POPULAR', cache.refresh_quote), ('QUIET', cache.refresh_quote)])
+
+    def test_lookups_count_towards_popularity(self):
+        popularity._hits.clear()
+        prewarm.track(['AAPL'])
+        cache.load('AAPL')
+        cache.load('MSFT')
+        cache.load('AAPL')
+        # page views do not write, the counts of the process are flushed together
+        self.assertEqual(RefreshJob.objects.get(symbol='AAPL').hits, 0)
+        self.assertEqual(dict(popularity._hits), {'AAPL': 2})
+        popularity.flush_hits()
+        self.assertEqual(RefreshJob.objects.get(symbol='AAPL').hits, 2)
+
+    def test_job_refreshes_the_cache_and_backs_off_after_failures(self):
+        prewarm.track(['AAPL', 'BAD'])
+        RefreshJob.objects.filter(symbol='AAPL').update(hits=5)
+        jobs = {job.symbol: job for job in RefreshJob.objects.all()}
+        self.assertIsNone(prewarm.run_job(jobs['AAPL'], cache.refresh_fundamentals))
+        self.assertTrue(CachedFundamentals.objects.filter(symbol='AAPL').exists())
+        self.assertEqual(RefreshJob.objects.get(symbol='AAPL').hits, 2)
+
+        with mock.patch('roi_calculator.cache.TickerSnapshot.fetch', side_effect=upstream.UpstreamUnavailable('down')):
+            self.assertEqual(prewarm.run_job(jobs['BAD'], cache.refresh_fundamentals), 'UpstreamUnavailable: down')
+        job = RefreshJob.objects.get(symbol='BAD')
+        self.assertEqual((job.failures, job.leased_until), (1, None))
+        self.assertGreater(job.not_before, timezone.now())
+        self.assertEqual(prewarm.plan(timezone.now(), timedelta(0)), [])
+
+
+LISTING = 'symbol,name\nAAPL,Apple Inc.\nAMZN,"Amazon.com, Inc."\nAPP,AppLovin Corporation\nMSFT,Microsoft Corporation\n'
+
+
+class SymbolIndexTests(TestCase):
+    def setUp(self):
+        self.listing = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.listing.write(LISTING)
+        self.listing.close()
+        self.addCleanup(os.remove, self.listing.name)
+        self.settings = override_settings(SYMBOL_LISTING_FILE=self.listing.name)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_symbols_and_names_are_completed_by_prefix(self):
+        index = SymbolIndex([('AAPL', 'Apple Inc.'), ('APP', 'AppLovin Corporation'), ('MSFT', 'Microsoft Corporation')])
+        self.assertIn('APP', index)
+        self.assertNotIn('AP', index)
+        # symbols first, then the names
+        self.assertEqual([symbol for symbol, _ in index.complete('ap')], ['APP', 'AAPL'])
+        self.assertEqual([symbol for symbol, _ in index.complete('corp')], ['APP', 'MSFT'])
+        self.assertEqual(index.suggest('APPL'), ['APP', 'AAPL'])
+
+    def test_search_form_rejects_unknown_symbols(self):
+        response = self.client.post('/', {'ticker': 'appl'})
+        self.assertContains(response, 'APPL is not a listed symbol. Did you mean APP, AAPL?')
+        self.assertRedirects(self.client.post('/', {'ticker': 'aapl'}), '/ticker/AAPL/', fetch_redirect_response=False)
+        # not in the listing of the US exchanges, let through
+        self.assertRedirects(self.client.post('/', {'ticker': 'sap.de'}), '/ticker/SAP.DE/',
+                             fetch_redirect_response=False)
+        response = self.client.get('/symbols/', {'q': 'amaz'})
+        self.assertEqual(response.json(), {'symbols': [{'symbol': 'AMZN', 'name': 'Amazon.com, Inc.'}]})
+
+    def test_nasdaq_directories_are_converted(self):
+        directory = (
+            'ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|NASDAQ Symbol\n'
+            'BRK.B|Berkshire Hathaway Inc. Class B|N|BRK.B|N|100|N|BRK.B\n'
+            'ZXZZT|Test Issue|N|ZXZZT|N|100|Y|ZXZZT\n'
+            'ABR$D|Arbor Realty Trust Preferred|N|ABRpD|N|100|N|ABR-D\n'
+            'File Creation Time: 1018202600:01|||||||\n'
+        )
+        self.assertEqual(list(parse_directory(directory)), [('BRK-B', 'Berkshire Hathaway Inc. Class B')])
+
+
+class StartupTests(TestCase):
+    @override_settings(VALUATION_DATA_SOURCE='stub', CHART_MODE='static')
+    def test_nothing_heavy_is_needed_for_stub_data_and_static_charts(self):
+        self.assertEqual(lazy_modules(), [])
+        with override_settings(VALUATION_DATA_SOURCE='yfinance', CHART_MODE='inline'):
+            self.assertEqual(lazy_modules(), ['yfinance', 'plotly.graph_objs', 'plotly.io'])
+
+    def test_import_times_are_summed_per_package(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:      1500 |       1500 |     pandas._libs\n'
+            'import time:       500 |       2000 |   pandas\n'
+            'import time:       250 |       2250 | roi_calculator.views\n'
+        )
+        self.assertEqual(import_times(stderr), {'pandas': 2.0, 'roi_calculator': 0.25})
+
+
+class UnlistedTicker(StubTicker):
+    """What yfinance returns for a symbol it does not know: a quote without price and shares."""
+
+    def __init__(self, symbol, info=None):
+        super().__init__(symbol)
+        self.quote = info if info is not None else {'symbol': self.ticker, 'regularMarketPrice': None}
+        self.fetched = []
+
+    def __getattr__(self, name):
+        if name == 'info':
+            return self.quote
+        self.fetched.append(name)
+        return super().__getattr__(name)
+
+
+@override_settings(VALUATION_DATA_SOURCE='stub', STUB_LATENCY=0)
+class FailedSymbolTests(TestCase):
+    def test_unknown_symbol_fails_before_the_statements_and_is_not_retried(self):
+        ticker = UnlistedTicker('XXXX')
+        with mock.patch('roi_calculator.cache.upstream_ticker', return_value=ticker):
+            with self.assertRaises(CannotValue):
+                cache.load('xxxx')
+            self.assertNotIn('balancesheet', ticker.fetched)
+            failed = FailedSymbol.objects.get(symbol='XXXX')
+            self.assertEqual((failed.failures, failed.reason), (1, 'no regularMarketPrice, sharesOutstanding, '
+                                                                   'marketCap, currency in the quote data'))
+            with mock.patch('roi_calculator.cache.TickerSnapshot.fetch') as fetch, self.assertRaises(CannotValue):
+                cache.load('XXXX')
+            fetch.assert_not_called()
+
+    @override_settings(UPSTREAM_RETRIES=1, UPSTREAM_BACKOFF=0)
+    def test_empty_quote_is_retried_and_not_negative_cached(self):
+        upstream._breakers.clear()
+        self.addCleanup(upstream._breakers.clear)
+        # yfinance 0.1.70 when Yahoo throttles the quote page
+        ticker = UnlistedTicker('AAPL', info={'regularMarketPrice': None})
+        with mock.patch('roi_calculator.cache.upstream_ticker', return_value=ticker), \
+                self.assertRaises(upstream.UpstreamUnavailable):
+            cache.load('AAPL')
+        self.assertFalse(FailedSymbol.objects.exists())
+
+    def test_failures_back_off_and_a_valuation_clears_them(self):
+        for _ in range(3):
+            failures.record_failure('AAPL', 'no data')
+        failed = FailedSymbol.objects.get(symbol='AAPL')
+        self.assertEqual(failed.failures, 3)
+        self.assertAlmostEqual((failed.retry_after - failed.failed_on).total_seconds(), 4 * 3600)
+        FailedSymbol.objects.filter(symbol='AAPL').update(retry_after=timezone.now())
+        cache.load('AAPL')
+        self.assertFalse(FailedSymbol.objects.filter(symbol='AAPL').exists())
+
+    def test_ticker_page_explains_why(self):
+        failures.record_failure('XXXX', 'no marketCap in the quote data')
+        response = self.client.get('/ticker/XXXX/')
+        self.assertContains(response, 'There is no marketCap in the quote data.', status_code=404)
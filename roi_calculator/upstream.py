@@ -0,0 +1,227 @@
+import fcntl
+import os
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+_lock = threading.Lock()
+_buckets = {}
+_breakers = {}
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamUnavailable(UpstreamError):
+    pass
+
+
+class EmptyResponse(UpstreamError):
+    """The upstream answered without any data.
+
+    yfinance swallows throttling and server errors and returns an empty frame or quote
+    instead, so this is retried like them.
+    """
+
+
+class TimeoutSession(requests.Session):
+    """requests session with a default timeout, yfinance downloads the quote pages without one."""
+
+    timeout = None
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+def set_timeout(ticker, timeout):
+    # for the calls of the ticker which take no timeout argument, only yf.Ticker has a session
+    session = getattr(ticker, 'session', None)
+    if isinstance(session, TimeoutSession):
+        session.timeout = timeout
+
+
+def refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class TokenBucket:
+    """At most ``rate`` calls per second on average and ``burst`` at once, shared by the threads of a process."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def take(self):
+        # takes a token and returns 0, or returns the seconds until the next token
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = refill(self._tokens, self._updated, now, self.rate, self.burst)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.take()
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise UpstreamUnavailable('rate limit reached')
+            time.sleep(wait)
+
+
+class FileTokenBucket(TokenBucket):
+    """Token bucket kept in a file, so all worker processes share the rate."""
+
+    def __init__(self, path, rate, burst):
+        super().__init__(rate, burst)
+        self.path = path
+
+    def take(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            state = f.read().split()
+            now = time.time()
+            tokens, updated = (float(state[0]), float(state[1])) if len(state) == 2 else (float(self.burst), now)
+            tokens = refill(tokens, updated, now, self.rate, self.burst)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            f.seek(0)
+            f.truncate()
+            f.write(f'{tokens} {now}')
+            return wait
+
+
+class CircuitBreaker:
+    """Stops calling the upstream after ``threshold`` failures in a row for ``cooldown`` seconds.
+
+    After the cooldown a single trial call is let through, its outcome closes the
+    breaker again or keeps it open for another cooldown.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.cooldown:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def cancel(self):
+        # the call did not reach the upstream, let another one be the trial
+        with self._lock:
+            self._trial = False
+
+
+def rate_limiter():
+    # One bucket per configuration. The limit protects Yahoo, the local stub and fixture
+    # sources are not limited, and neither is anything with UPSTREAM_RATE = 0.
+    if not settings.UPSTREAM_RATE or settings.VALUATION_DATA_SOURCE != 'yfinance':
+        return None
+    key = (settings.UPSTREAM_RATE, settings.UPSTREAM_BURST, settings.UPSTREAM_RATE_LIMIT_FILE)
+    with _lock:
+        if key not in _buckets:
+            if settings.UPSTREAM_RATE_LIMIT_FILE:
+                _buckets[key] = FileTokenBucket(settings.UPSTREAM_RATE_LIMIT_FILE, *key[:2])
+            else:
+                _buckets[key] = TokenBucket(*key[:2])
+        return _buckets[key]
+
+
+def circuit_breaker():
+    key = (settings.UPSTREAM_BREAKER_THRESHOLD, settings.UPSTREAM_BREAKER_COOLDOWN)
+    with _lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(*key)
+        return _breakers[key]
+
+
+def is_transient(error):
+    # worth another try: connection problems, timeouts, throttling and server errors
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, EmptyResponse)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+def backoff(attempt):
+    # exponential with full jitter, so throttled workers do not retry in lockstep
+    return random.uniform(0, settings.UPSTREAM_BACKOFF * 2 ** attempt)
+
+
+def call(func, *args):
+    """Runs one upstream call behind the circuit breaker and the rate limit, retrying transient failures.
+
+    Raises UpstreamUnavailable when the breaker is open, no token comes up in time or
+    the retries are used up. Other errors are raised as is and do not count for the breaker.
+    """
+    breaker = circuit_breaker()
+    if not breaker.allow():
+        raise UpstreamUnavailable('circuit breaker is open')
+    limiter = rate_limiter()
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            try:
+                limiter.acquire(max(0, settings.UPSTREAM_CALL_TIMEOUT - (time.monotonic() - started)))
+            except UpstreamUnavailable:
+                breaker.cancel()
+                raise
+        try:
+            result = func(*args)
+        except Exception as e:
+            if not is_transient(e):
+                # says nothing about the upstream, a trial call leaves the breaker as it was
+                breaker.cancel()
+                raise
+            delay = backoff(attempt)
+            if attempt >= settings.UPSTREAM_RETRIES or \
+                    time.monotonic() - started + delay > settings.UPSTREAM_CALL_TIMEOUT:
+                breaker.failure()
+                raise UpstreamUnavailable(f'{type(e).__name__}: {e}') from e
+            time.sleep(delay)
+            attempt += 1
+        else:
+            breaker.success()
+            return result
@@ -1,7 +1,19 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
     path('', views.ticker_form, name='roi_calculator-ticker_form'),
-    path('ticker/<str:ticker>/', views.ticker_view, name='roi_calculator-ticker_view'),
+    path('ticker/<str:ticker>/', views.ticker_view_async if settings.ASYNC_VIEWS else views.ticker_view,
+         name='roi_calculator-ticker_view'),
+    path('ticker/<str:ticker>/chart.json', views.chart_data_async if settings.ASYNC_VIEWS else views.chart_data,
+         name='roi_calculator-chart_data'),
+    path('ticker/<str:ticker>/sections/<str:section>/',
+         views.ticker_partial_async if settings.ASYNC_VIEWS else views.ticker_partial,
+         name='roi_calculator-ticker_partial'),
+    path('screener/', views.screener, name='roi_calculator-screener'),
+    path('symbols/', views.symbol_search, name='roi_calculator-symbols'),
+    path('api/v1/valuation/<str:ticker>', views.api_valuation, name='roi_calculator-api_valuation'),
+    path('api/v1/valuations', views.api_valuations, name='roi_calculator-api_valuations'),
+    path('metrics', views.metrics_view, name='roi_calculator-metrics'),
 ]
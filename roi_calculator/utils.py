@@ -1,85 +1,116 @@
 from .values.math_constants import THOUSAND as K, MILLION as M, HUNDRED as H
+from django.conf import settings
+from .scoring import get_scoring_model
+from .relative import get_percentile_index
+from .metrics import span
+from .splits import adjusted_history, fiscal_year_end
 import statistics
-from datetime import datetime, date
-from configparser import ConfigParser
-from plotly.offline import plot
-import plotly.graph_objs as go
+from datetime import datetime
 
 
-def valuation_dictionary(ticker):
+def valuation_dictionary(snapshot):
     # BASIC INFO
-    info = ticker.info
+    info = snapshot.info
     current_shares_outstanding_in_mil = info['sharesOutstanding'] / M
-    market_price = info['regularMarketPrice']
     # BALANCE SHEET
-    balance_sheet = ticker.balancesheet
-    quarterly_balance_sheet = ticker.quarterly_balancesheet
-    balance_sheet.to_csv('balance_sheet.csv')
+    balance_sheet = snapshot.balancesheet
+    quarterly_balance_sheet = snapshot.quarterly_balancesheet
     # EARNINGS
-    earnings = ticker.earnings
-    quarterly_earnings = ticker.quarterly_earnings
-    earnings_dict = ticker.earnings['Earnings'].to_dict()
+    earnings = snapshot.earnings
+    quarterly_earnings = snapshot.quarterly_earnings
     # CALCULATED VALUES
-    last_4_fiscal_yrs = sorted(list(earnings_dict.keys()), reverse=True)
-    shares_outstanding_complete = shares_outstanding_last_4_yrs(ticker, last_4_fiscal_yrs)
+    last_4_fiscal_yrs = sorted(earnings.index, reverse=True)
+    # shares, EPS and median price per fiscal year, adjusted for the splits since
+    adjusted = adjusted_history(
+        snapshot.history, snapshot.shares, current_shares_outstanding_in_mil, earnings['Earnings'], last_4_fiscal_yrs,
+        fiscal_year_end(balance_sheet))
     total_stockholders_equity_in_mil = quarterly_balance_sheet.loc[
         'Total Stockholder Equity'][0] / M
     earnings_last_4_quarters_sum = earnings_sum_last_4_quarters(quarterly_earnings)
     current_eps = earnings_per_share(earnings_last_4_quarters_sum, current_shares_outstanding_in_mil)
-    current_pe_ratio = price_earnings_ratio(market_price, current_eps)
     current_roe = return_on_equity(earnings_last_4_quarters_sum, total_stockholders_equity_in_mil)
     tse_per_share = total_stockholders_equity_per_share(
         total_stockholders_equity_in_mil, current_shares_outstanding_in_mil)
-    eps_last_4_yrs = earnings_per_share_last_4_yrs_in_mil(last_4_fiscal_yrs, earnings_dict, shares_outstanding_complete)
     roe_4_yrs_median = return_on_equity_4yrs_median(balance_sheet, earnings)
-    pe_ratio_4_yrs_median = price_earnings_ratio_4_yrs_median(ticker, last_4_fiscal_yrs, eps_last_4_yrs)
-    payout_ratio_4_yrs_median = dividend_payout_ratio_4_yrs_median(
-        ticker, last_4_fiscal_yrs, earnings_dict, shares_outstanding_complete)
-    f_score = piotroski_f_score(ticker)
-    z_score = altman_z_score(ticker)
+    pe_ratio_4_yrs_median = price_earnings_ratio_4_yrs_median(adjusted)
+    payout_ratio_4_yrs_median = dividend_payout_ratio_4_yrs_median(snapshot, adjusted)
+    with span('f_score'):
+        f_score = piotroski_f_score(snapshot)
+    with span('z_score'):
+        z_score = altman_z_score(snapshot)
 
     ticker_fundamentals = {
         # basics
-        'name': info['longName'],
+        'name': company_name(info),
         'symbol': info['symbol'],
-        'price': market_price,
-        'currency': info['currency'],
-        'market_cap': info['marketCap'] / M,
-        'market_cap_original': info['marketCap'],
         'shares_outstanding': current_shares_outstanding_in_mil,
-        'country': info['country'],
-        'description': info['longBusinessSummary'],
+        'description': info.get('longBusinessSummary') or '',
         'data_saved_on': datetime.now(),
         # ratios, earnings, roe
-        'peg_ratio': info['pegRatio'],
-        'pfcf_ratio': info['marketCap'] / info['freeCashflow'] if info['freeCashflow'] is not None else None,
-        'ps_ratio': info['priceToSalesTrailing12Months'],
-        'pb_ratio': info['priceToBook'],
         'ytd_earnings': earnings_last_4_quarters_sum,
         'eps': current_eps,
-        'pe_ratio': current_pe_ratio,
         'pe_ratio_median': pe_ratio_4_yrs_median,
         'roe': current_roe,
         'roe_median': roe_4_yrs_median,
-        'debt_to_equity': info['debtToEquity'] / H if info['debtToEquity'] is not None else None,
-        'quick_ratio': info['quickRatio'],
-        'current_ratio': info['currentRatio'],
         'tse': total_stockholders_equity_in_mil,
         'tse_original': total_stockholders_equity_in_mil * M,
         'tse_per_share': tse_per_share,
         # dividends
-        'dividend_yield': info['dividendYield'] * H if info['dividendYield'] is not None else None,
-        'dividend_value': info['lastDividendValue'],
-        'payout_ratio': info['payoutRatio'] if info['dividendYield'] is not None else None,
         'payout_ratio_median': payout_ratio_4_yrs_median,
-        'ex_divi_date': info['exDividendDate'],
         # scores
         'f_score': f_score,
         'z_score': z_score,
     }
+    ticker_fundamentals.update(quote_dictionary(info, current_eps))
     return ticker_fundamentals
 
 
+def quote_dictionary(info, eps):
+    # values which only depend on ticker.info and move with the market price,
+    # so they can be refreshed without downloading the financial statements again
+    market_price = info['regularMarketPrice']
+    return {
+        'price': market_price,
+        'currency': info['currency'],
+        'market_cap': info['marketCap'] / M,
+        'market_cap_original': info['marketCap'],
+        'country': info.get('country'),
+        # funds and indices come without one
+        'sector': info.get('sector'),
+        # the rest is n/a on the page when missing, see failures.REQUIRED_INFO for what is not optional
+        'peg_ratio': info.get('pegRatio'),
+        'pfcf_ratio': info['marketCap'] / info['freeCashflow'] if info.get('freeCashflow') else None,
+        'ps_ratio': info.get('priceToSalesTrailing12Months'),
+        'pb_ratio': info.get('priceToBook'),
+        'pe_ratio': price_earnings_ratio(market_price, eps),
+        'debt_to_equity': info['debtToEquity'] / H if info.get('debtToEquity') is not None else None,
+        'quick_ratio': info.get('quickRatio'),
+        'current_ratio': info.get('currentRatio'),
+        'dividend_yield': info['dividendYield'] * H if info.get('dividendYield') is not None else None,
+        'dividend_value': info.get('lastDividendValue'),
+        'payout_ratio': info.get('payoutRatio') if info.get('dividendYield') is not None else None,
+        'ex_divi_date': info.get('exDividendDate'),
+    }
+
+
+def basic_info_dictionary(info):
+    # what the page shell shows before the statements are downloaded
+    return {
+        'name': company_name(info),
+        'symbol': info['symbol'],
+        'description': info.get('longBusinessSummary') or '',
+        'data_saved_on': datetime.now(),
+        'price': info['regularMarketPrice'],
+        'currency': info['currency'],
+        'market_cap_original': info['marketCap'],
+        'country': info.get('country'),
+    }
+
+
+def company_name(info):
+    return info.get('longName') or info.get('shortName') or info['symbol']
+
+
 # region Stock Scoring Model
 def stock_overall_score(stock_scoring):
     total = 0
@@ -96,73 +127,18 @@ def stock_overall_score(stock_scoring):
 
 
 def stock_scoring(fundamentals):
-    c = ConfigParser()
-    c.read('roi_calculator/values/scoring.ini')
-
-    stock_score = {
-        'debt_to_equity': (calculate_score_lower_than(fundamentals['debt_to_equity'], c.getfloat('debt_to_equity', 'bm1'), c.getfloat('debt_to_equity', 'bm2'), c.getfloat('debt_to_equity', 'bm3'), c.getfloat('debt_to_equity', 'bm4'), c.getfloat('debt_to_equity', 'bm5')), c.getfloat('debt_to_equity', 'weight')),
-        'f_score': (calculate_score_higher_than(fundamentals['f_score'], c.getfloat('f_score', 'bm1'), c.getfloat('f_score', 'bm2'), c.getfloat('f_score', 'bm3'), c.getfloat('f_score', 'bm4'), c.getfloat('f_score', 'bm5')), c.getfloat('f_score', 'weight')),
-        'z_score': (calculate_score_higher_than(fundamentals['z_score'], c.getfloat('z_score', 'bm1'), c.getfloat('z_score', 'bm2'), c.getfloat('z_score', 'bm3'), c.getfloat('z_score', 'bm4'), c.getfloat('z_score', 'bm5')), c.getfloat('z_score', 'weight')),
-        'roe': (calculate_score_higher_than(fundamentals['roe'], c.getfloat('roe', 'bm1'), c.getfloat('roe', 'bm2'), c.getfloat('roe', 'bm3'), c.getfloat('roe', 'bm4'), c.getfloat('roe', 'bm5')), c.getfloat('roe', 'weight')),
-        # EPS placeholder - need to decide if I want to score based on if it's growing yoy
-        'dividend_yield': (calculate_score_higher_than(fundamentals['dividend_yield'], c.getfloat('dividend_yield', 'bm1'), c.getfloat('dividend_yield', 'bm2'), c.getfloat('dividend_yield', 'bm3'), c.getfloat('dividend_yield', 'bm4'), c.getfloat('dividend_yield', 'bm5')), c.getfloat('dividend_yield', 'weight')),
-        'payout_ratio': (calculate_score_lower_than(fundamentals['payout_ratio'], c.getfloat('payout_ratio', 'bm1'), c.getfloat('payout_ratio', 'bm2'), c.getfloat('payout_ratio', 'bm3'), c.getfloat('payout_ratio', 'bm4'), c.getfloat('payout_ratio', 'bm5')), c.getfloat('payout_ratio', 'weight')) if fundamentals['dividend_yield'] is not None else ((0, 'score-na'), c.getfloat('payout_ratio', 'weight')),
-        'pe_ratio': (calculate_score_lower_than(fundamentals['pe_ratio'], c.getfloat('pe_ratio', 'bm1'), c.getfloat('pe_ratio', 'bm2'), c.getfloat('pe_ratio', 'bm3'), c.getfloat('pe_ratio', 'bm4'), c.getfloat('pe_ratio', 'bm5')), c.getfloat('pe_ratio', 'weight')),
-        'peg_ratio': (calculate_score_lower_than(fundamentals['peg_ratio'], c.getfloat('peg_ratio', 'bm1'), c.getfloat('peg_ratio', 'bm2'), c.getfloat('peg_ratio', 'bm3'), c.getfloat('peg_ratio', 'bm4'), c.getfloat('peg_ratio', 'bm5')), c.getfloat('peg_ratio', 'weight')),
-        # PS ratio - score based on what? not possible to score based on absolute values
-        'pb_ratio': (calculate_score_lower_than(fundamentals['pb_ratio'], c.getfloat('pb_ratio', 'bm1'), c.getfloat('pb_ratio', 'bm2'), c.getfloat('pb_ratio', 'bm3'), c.getfloat('pb_ratio', 'bm4'), c.getfloat('pb_ratio', 'bm5')), c.getfloat('pb_ratio', 'weight')),
-        'pfcf_ratio': (calculate_score_lower_than(fundamentals['pfcf_ratio'], c.getfloat('pfcf_ratio', 'bm1'), c.getfloat('pfcf_ratio', 'bm2'), c.getfloat('pfcf_ratio', 'bm3'), c.getfloat('pfcf_ratio', 'bm4'), c.getfloat('pfcf_ratio', 'bm5')), c.getfloat('pfcf_ratio', 'weight')),
-        'quick_ratio': (calculate_score_higher_than(fundamentals['quick_ratio'], c.getfloat('quick_ratio', 'bm1'), c.getfloat('quick_ratio', 'bm2'), c.getfloat('quick_ratio', 'bm3'), c.getfloat('quick_ratio', 'bm4'), c.getfloat('quick_ratio', 'bm5')), c.getfloat('quick_ratio', 'weight')),
-        'current_ratio': (calculate_score_higher_than(fundamentals['current_ratio'], c.getfloat('current_ratio', 'bm1'), c.getfloat('current_ratio', 'bm2'), c.getfloat('current_ratio', 'bm3'), c.getfloat('current_ratio', 'bm4'), c.getfloat('current_ratio', 'bm5')), c.getfloat('current_ratio', 'weight')),
-        'pe_ratio_median': (calculate_score_lower_than(fundamentals['pe_ratio_median'], c.getfloat('pe_ratio_median', 'bm1'), c.getfloat('pe_ratio_median', 'bm2'), c.getfloat('pe_ratio_median', 'bm3'), c.getfloat('pe_ratio_median', 'bm4'), c.getfloat('pe_ratio_median', 'bm5')), c.getfloat('pe_ratio_median', 'weight')),
-        'roe_median': (calculate_score_higher_than(fundamentals['roe_median'], c.getfloat('roe_median', 'bm1'), c.getfloat('roe_median', 'bm2'), c.getfloat('roe_median', 'bm3'), c.getfloat('roe_median', 'bm4'), c.getfloat('roe_median', 'bm5')), c.getfloat('roe_median', 'weight')),
-        'payout_ratio_median': (calculate_score_lower_than(fundamentals['payout_ratio_median'], c.getfloat('payout_ratio_median', 'bm1'), c.getfloat('payout_ratio_median', 'bm2'), c.getfloat('payout_ratio_median', 'bm3'), c.getfloat('payout_ratio_median', 'bm4'), c.getfloat('payout_ratio_median', 'bm5')), c.getfloat('payout_ratio_median', 'weight')),
-    }
-    # print_score(fundamentals, stock_score)
-    return stock_score
-
-
-def calculate_score_lower_than(value, bm1, bm2, bm3, bm4, bm5):
-    if value == None or value <= 0:
-        return (0, 'score-na')
-    if value <= bm1:
-        return (100, 'score-100')
-    if value <= bm2:
-        return (80, 'score-80')
-    if value <= bm3:
-        return (60, 'score-60')
-    if value <= bm4:
-        return (40, 'score-40')
-    if value <= bm5:
-        return (20, 'score-20')
-    if value > bm5:
-        return (0, 'score-na')
-
-
-def calculate_score_higher_than(value, bm1, bm2, bm3, bm4, bm5):
-    if value == None:
-        return (0, 'score-na')
-    if value >= bm1:
-        return (100, 'score-100')
-    if value >= bm2:
-        return (80, 'score-80')
-    if value >= bm3:
-        return (60, 'score-60')
-    if value >= bm4:
-        return (40, 'score-40')
-    if value >= bm5:
-        return (20, 'score-20')
-    if value < bm5:
-        return (0, 'score-na')
+    if settings.SCORING_MODE == 'relative':
+        return get_percentile_index().score(fundamentals)
+    return get_scoring_model().score(fundamentals)
 # endregion Stock Scoring Model
 
 # region Altman Z Score
 
 
-def altman_z_score(ticker):
-    bs = ticker.quarterly_balancesheet
-    qf = ticker.quarterly_financials
-    qe = ticker.quarterly_earnings
+def altman_z_score(snapshot):
+    bs = snapshot.quarterly_balancesheet
+    qf = snapshot.quarterly_financials
+    qe = snapshot.quarterly_earnings
     # A=Working capital/total assets
     # B=Retained earnings/total assets
     # C=Earnings before interest and taxes (EBIT)/total assets
@@ -181,7 +157,7 @@ def altman_z_score(ticker):
     else:
         c = 0
     if 'Total Liab' in bs:
-        d = ticker.info['marketCap'] / bs.loc['Total Liab'][0]
+        d = snapshot.info['marketCap'] / bs.loc['Total Liab'][0]
     else:
         d = 0
     if 'Revenue' in qe and 'Total Assets' in bs:
@@ -193,89 +169,91 @@ def altman_z_score(ticker):
 
 
 # region Piotroski F Score
-def piotroski_f_score(ticker):
+def piotroski_f_score(snapshot):
     f_score = 0
     # Positive net income (1 point)
-    if earnings_sum_last_4_quarters(ticker.quarterly_earnings) > 0:
+    if earnings_sum_last_4_quarters(snapshot.quarterly_earnings) > 0:
         f_score += 1
     # Positive return on assets (ROA) in the current year (1 point)
-    if return_on_assets(ticker) > 0:
+    if return_on_assets(snapshot) > 0:
         f_score += 1
     # Positive operating cash flow in the current year (1 point)
-    if positive_operating_cashflow(ticker):
+    if positive_operating_cashflow(snapshot):
         f_score += 1
     # Cash flow from operations being greater than net Income (quality of earnings) (1 point)
-    if operating_cashflow_greater_than_net_income(ticker):
+    if operating_cashflow_greater_than_net_income(snapshot):
         f_score += 1
     # Lower amount of long term debt in the current period, compared to the previous year (decreased leverage) (1 point)
-    if lower_long_term_debt_than_prev_year(ticker):
+    if lower_long_term_debt_than_prev_year(snapshot):
         f_score += 1
     # Higher current ratio this year compared to the previous year (more liquidity) (1 point)
-    if higher_current_ratio_than_prev_year(ticker):
+    if higher_current_ratio_than_prev_year(snapshot):
         f_score += 1
     # No new shares were issued in the last year (lack of dilution) (1 point).
-    if ticker.shares is not None:
-        if no_new_shares_issued(ticker):
+    if snapshot.shares is not None:
+        if no_new_shares_issued(snapshot):
             f_score += 1
     else:
         f_score += 0.5
     # A higher gross margin compared to the previous year (1 point)
-    if higher_gross_margin_than_prev_year(ticker):
+    if higher_gross_margin_than_prev_year(snapshot):
         f_score += 1
     # A higher asset turnover ratio compared to the previous year (1 point)
-    if higher_asset_turnover_ration_than_prev_year(ticker):
+    if higher_asset_turnover_ration_than_prev_year(snapshot):
         f_score += 1
     return f_score
 
 
-def return_on_assets(ticker):
-    earnings = ticker.quarterly_earnings['Earnings'].sum()
-    assets = ticker.quarterly_balancesheet.loc['Total Assets'].sum()
+def return_on_assets(snapshot):
+    earnings = snapshot.quarterly_earnings['Earnings'].sum()
+    assets = snapshot.quarterly_balancesheet.loc['Total Assets'].sum()
     return earnings / assets
 
 
-def positive_operating_cashflow(ticker):
-    if 'Total Cash From Operating Activities' in ticker.quarterly_cashflow:
-        return ticker.quarterly_cashflow.loc['Total Cash From Operating Activities'].sum() > 0
+def positive_operating_cashflow(snapshot):
+    if 'Total Cash From Operating Activities' in snapshot.quarterly_cashflow:
+        return snapshot.quarterly_cashflow.loc['Total Cash From Operating Activities'].sum() > 0
     else:
         return False
 
 
-def operating_cashflow_greater_than_net_income(ticker):
-    if 'Total Cash From Operating Activities' in ticker.quarterly_cashflow:
-        operating_cashflow = ticker.quarterly_cashflow.loc['Total Cash From Operating Activities'].sum()
-        net_income = ticker.quarterly_cashflow.loc['Net Income'].sum()
+def operating_cashflow_greater_than_net_income(snapshot):
+    if 'Total Cash From Operating Activities' in snapshot.quarterly_cashflow:
+        operating_cashflow = snapshot.quarterly_cashflow.loc['Total Cash From Operating Activities'].sum()
+        net_income = snapshot.quarterly_cashflow.loc['Net Income'].sum()
         return operating_cashflow > net_income
     else:
         return False
 
 
-def lower_long_term_debt_than_prev_year(ticker):
-    if 'Long Term Debt' in ticker.balancesheet:
-        return ticker.balancesheet.loc['Long Term Debt'][0] < ticker.balancesheet.loc['Long Term Debt'][1]
+def lower_long_term_debt_than_prev_year(snapshot):
+    if 'Long Term Debt' in snapshot.balancesheet:
+        return snapshot.balancesheet.loc['Long Term Debt'][0] < snapshot.balancesheet.loc['Long Term Debt'][1]
     else:
         return False
 
 
-def higher_current_ratio_than_prev_year(ticker):
-    current_year = ticker.balancesheet.loc['Total Assets'][0] / ticker.balancesheet.loc['Total Liab'][0]
-    prev_year = ticker.balancesheet.loc['Total Assets'][1] / ticker.balancesheet.loc['Total Liab'][1]
+def higher_current_ratio_than_prev_year(snapshot):
+    bs = snapshot.balancesheet
+    current_year = bs.loc['Total Assets'][0] / bs.loc['Total Liab'][0]
+    prev_year = bs.loc['Total Assets'][1] / bs.loc['Total Liab'][1]
     return current_year > prev_year
 
 
-def no_new_shares_issued(ticker):
-    return ticker.shares.iloc[-1][0] <= ticker.shares.iloc[-2][0]
+def no_new_shares_issued(snapshot):
+    return snapshot.shares.iloc[-1][0] <= snapshot.shares.iloc[-2][0]
 
 
-def higher_gross_margin_than_prev_year(ticker):
-    current_year = ticker.financials.loc['Gross Profit'][0] / ticker.financials.loc['Total Revenue'][0]
-    prev_year = ticker.financials.loc['Gross Profit'][1] / ticker.financials.loc['Total Revenue'][1]
+def higher_gross_margin_than_prev_year(snapshot):
+    financials = snapshot.financials
+    current_year = financials.loc['Gross Profit'][0] / financials.loc['Total Revenue'][0]
+    prev_year = financials.loc['Gross Profit'][1] / financials.loc['Total Revenue'][1]
     return current_year > prev_year
 
 
-def higher_asset_turnover_ration_than_prev_year(ticker):
-    e = ticker.earnings
-    bs = ticker.balancesheet
+def higher_asset_turnover_ration_than_prev_year(snapshot):
+    e = snapshot.earnings
+    bs = snapshot.balancesheet
     try:
         current_year_total_assets = ((bs.loc['Total Assets'][0] + bs.loc['Total Assets'][1]) / 2)
     except IndexError:
@@ -290,82 +268,25 @@ def higher_asset_turnover_ration_than_prev_year(ticker):
 # endregion Piotroski F Score
 
 
-def shares_outstanding_last_4_yrs(ticker, last_4_fiscal_yrs):
-    shares_outstanding = {}
-    current_year = date.today().year
-    # check if data shares outstanding data is available
-    if ticker.shares is None:
-        for key in last_4_fiscal_yrs:
-            shares_outstanding[key] = ticker.info['sharesOutstanding'] / M
-    #  if available, match earnings years with shares outstanding years
-    else:
-        shares_fiscal_yrs = ticker.shares['BasicShares'].to_dict()
-        for key in last_4_fiscal_yrs:
-            shares_outstanding[key] = 0
-        for key in shares_fiscal_yrs:
-            shares_outstanding[key] = shares_fiscal_yrs[key] / M
-        # if year of shares outstanding is missing, fill it with year + 1 data
-        for key in shares_outstanding:
-            if shares_outstanding[key] == 0 and key + 1 in shares_outstanding:
-                shares_outstanding[key] = shares_outstanding[key+1] / M
-            elif shares_outstanding[key] == 0 and key + 1 not in shares_outstanding:
-                shares_outstanding[key] = shares_outstanding[key-1]
-    shares_outstanding[current_year] = ticker.info['sharesOutstanding'] / M
-    return shares_outstanding
-
-
-def earnings_per_share_last_4_yrs_in_mil(last_4_fiscal_yrs, earnings_dict, shares_outstanding_overview):
-    eps_last_4_yrs = {}
-    for year in last_4_fiscal_yrs:
-        eps_last_4_yrs[year] = (earnings_dict[year] / shares_outstanding_overview[year]) / M
-    return eps_last_4_yrs
-
-
-def yearly_median_price_last_4_yrs(ticker, last_4_fiscal_yrs):
-    price_history = ticker.history(period="5y")
-    median_price_last_4_yrs = {}
-    for year in last_4_fiscal_yrs:
-        median_price_last_4_yrs[year] = price_history[str(year) + '-01-01':str(year) + '-12-31']['Close'].median()
-    return median_price_last_4_yrs
-
-
-def yearly_pe_ratio_last_4_yrs(last_4_fiscal_yrs, median_price_last_4_yrs, eps_last_4_yrs):
-    pe_ratio_last_4_yrs = {}
-    for year in last_4_fiscal_yrs:
-        pe_ratio_last_4_yrs[year] = median_price_last_4_yrs[year] / eps_last_4_yrs[year]
-    return pe_ratio_last_4_yrs
-
-
-def price_earnings_ratio_4_yrs_median(ticker, last_4_fiscal_yrs, eps_last_4_yrs):
-    median_price_last_4_yrs = yearly_median_price_last_4_yrs(ticker, last_4_fiscal_yrs)
-    pe_ratio_last_4_yrs = yearly_pe_ratio_last_4_yrs(last_4_fiscal_yrs, median_price_last_4_yrs, eps_last_4_yrs)
-    return statistics.median(pe_ratio_last_4_yrs.values()) if statistics.median(pe_ratio_last_4_yrs.values()) <= 25 else 25
+def price_earnings_ratio_4_yrs_median(adjusted):
+    # median of the yearly median price over the EPS, capped at 25
+    pe_ratio_median = (adjusted['median_price'] / adjusted['eps']).median()
+    return pe_ratio_median if pe_ratio_median <= 25 else 25
 
 
 def earnings_sum_last_4_quarters(quarterly_earnings):
     return quarterly_earnings['Earnings'].sum()
 
 
-def dividends_paid_last_4_yrs(ticker, last_4_fiscal_yrs):
-    dividends = ticker.dividends
-    dividends_paid_last_4_yrs = {}
-    for year in last_4_fiscal_yrs:
-        dividends_paid_last_4_yrs[year] = dividends[str(year) + '-01-01':str(year) + '-12-31'].sum()
-    return dividends_paid_last_4_yrs
-
+def dividends_paid_last_4_yrs(snapshot, last_4_fiscal_yrs):
+    dividends = snapshot.dividends
+    return dividends.groupby(dividends.index.year).sum().reindex(last_4_fiscal_yrs, fill_value=0.0)
 
-def dividend_payout_ratio_last_4_yrs(last_4_fiscal_yrs, dividends_paid_last_4_yrs, earnings_per_share_last_4_yrs_in_mil):
-    payout_ratio_last_4_yrs = {}
-    for year in last_4_fiscal_yrs:
-        payout_ratio_last_4_yrs[year] = dividends_paid_last_4_yrs[year] / earnings_per_share_last_4_yrs_in_mil[year]
-    return payout_ratio_last_4_yrs
 
-
-def dividend_payout_ratio_4_yrs_median(ticker, last_4_fiscal_yrs, earnings_dict, shares_outstanding):
-    eps = earnings_per_share_last_4_yrs_in_mil(last_4_fiscal_yrs, earnings_dict, shares_outstanding)
-    dividends_paid = dividends_paid_last_4_yrs(ticker, last_4_fiscal_yrs)
-    payout_ratio = dividend_payout_ratio_last_4_yrs(last_4_fiscal_yrs, dividends_paid, eps)
-    return statistics.median(payout_ratio.values())
+def dividend_payout_ratio_4_yrs_median(snapshot, adjusted):
+    # dividends are split-adjusted like the prices, so they are paid per share of today as well
+    dividends_paid = dividends_paid_last_4_yrs(snapshot, adjusted.index)
+    return (dividends_paid / adjusted['eps']).median()
 
 
 def return_on_equity_4yrs_median(balance_sheet, earnings):
@@ -462,8 +383,11 @@ def print_score(fundamentals, stock_score):
     print(52*'=')
 
 
-def candlestick(ticker):
-    df = ticker.history(period="3mo", interval="1d")
+def candlestick(df):
+    # plotly is only needed for the 'inline' chart mode, it is not imported while the workers boot
+    import plotly.graph_objs as go
+    import plotly.io as pio
+
     fig = go.Figure(data=[go.Candlestick(x=df.index,
                                          open=df['Open'],
                                          high=df['High'],
@@ -479,5 +403,6 @@ def candlestick(ticker):
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#6272a4', color='#f8f8f2')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#6272a4', color='#f8f8f2')
 
-    candlestick_div = plot(fig, output_type='div')
+    # a fixed id instead of a random one, the page is the same for the same valuation (see ETag)
+    candlestick_div = pio.to_html(fig, full_html=False, div_id='candlestick-figure')
     return candlestick_div
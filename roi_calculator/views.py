@@ -1,42 +1,247 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from . import api, metrics
 from .forms import TickerForm, TickerFormSmall
-from .utils import valuation_dictionary, seven_yrs_overview, return_on_investment, stock_overall_score, stock_scoring, candlestick
-import yfinance as yf
+from .cache import load, aload, load_basic_info, aload_basic_info, needs_statements
+from .charts import PLOTLY_VERSION, achart_history, aget_chart, chart_history, get_chart
+from .conditional import conditional_ticker
+from .failures import CannotValue
+from .metrics import span
+from .upstream import UpstreamError
+from .projection import return_bands
+from .screener import CONTENT_TYPES, FORMATS, parse_symbols, screen, serialize
+from .symbols import get_symbol_index
+from .utils import seven_yrs_overview, return_on_investment, stock_overall_score, stock_scoring, candlestick
 
 
 def ticker_form(request):
     if request.method == 'GET':
+        if 'ticker' in request.GET:
+            # the search form of the navigation bar
+            return ticker_redirect(request, TickerFormSmall(request.GET))
         form = TickerForm()
         return render(request, 'search.html', {'form': form})
     if request.method == 'POST':
         form = TickerForm(request.POST)
         if form.is_valid():
-            ticker = form.cleaned_data['ticker'].upper().strip()
-        return redirect('/ticker/' + ticker + '/')
+            return redirect('/ticker/' + form.cleaned_data['ticker'] + '/')
+        return render(request, 'search.html', {'form': form})
+
+
+def cannot_value_page(view):
+    """Renders the reason a symbol cannot be valued instead of a server error."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, ticker, *args, **kwargs):
+            try:
+                return await view(request, ticker, *args, **kwargs)
+            except CannotValue as e:
+                return await sync_to_async(cannot_value)(request, e)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, ticker, *args, **kwargs):
+        try:
+            return view(request, ticker, *args, **kwargs)
+        except CannotValue as e:
+            return cannot_value(request, e)
+    return wrapper
+
 
+def cannot_value(request, error):
+    return render(request, 'cannot_value.html', {'symbol': error.symbol, 'reason': error.reason}, status=404)
 
+
+# sections of the ticker page which the progressive shell fetches separately
+PARTIALS = ('fundamentals', 'score', 'long_term')
+
+
+@conditional_ticker
+@cannot_value_page
 def ticker_view(request, ticker):
     if request.method == 'GET':
-        ticker = yf.Ticker(ticker)
-        fundamentals = valuation_dictionary(ticker)
+        if settings.PROGRESSIVE_RENDERING and needs_statements(ticker):
+            return render(request, 'ticker.html', shell_context(load_basic_info(ticker)))
+        with span('load'):
+            fundamentals, snapshot = load(ticker)
+        chart = None
+        if settings.CHART_MODE == 'inline':
+            price_history = snapshot.chart_history() if snapshot is not None else chart_history(ticker)
+            with span('chart'):
+                chart = candlestick(price_history)
+        context = ticker_context(fundamentals, chart)
+        with span('render'):
+            return render(request, 'ticker.html', context)
+    if request.method == 'POST':
+        return ticker_redirect(request, TickerFormSmall(request.POST))
+
+
+@conditional_ticker
+@cannot_value_page
+async def ticker_view_async(request, ticker):
+    if request.method == 'GET':
+        if settings.PROGRESSIVE_RENDERING and await sync_to_async(needs_statements)(ticker):
+            context = shell_context(await aload_basic_info(ticker))
+            return await sync_to_async(render)(request, 'ticker.html', context)
+        with span('load'):
+            fundamentals, snapshot = await aload(ticker)
+        chart = None
+        if settings.CHART_MODE == 'inline':
+            price_history = snapshot.chart_history() if snapshot is not None else await achart_history(ticker)
+            with span('chart'):
+                chart = await sync_to_async(candlestick, thread_sensitive=False)(price_history)
+        context = ticker_context(fundamentals, chart)
+        with span('render'):
+            return await sync_to_async(render)(request, 'ticker.html', context)
+    if request.method == 'POST':
+        return ticker_redirect(request, TickerFormSmall(request.POST))
+
+
+@conditional_ticker
+@cannot_value_page
+def ticker_partial(request, ticker, section):
+    if section not in PARTIALS:
+        raise Http404
+    with span('load'):
+        fundamentals, _ = load(ticker)
+    context = ticker_context(fundamentals, None)
+    with span('render'):
+        return render(request, f'fragments/ticker_{section}.html', context)
+
+
+@conditional_ticker
+@cannot_value_page
+async def ticker_partial_async(request, ticker, section):
+    if section not in PARTIALS:
+        raise Http404
+    with span('load'):
+        fundamentals, _ = await aload(ticker)
+    context = ticker_context(fundamentals, None)
+    with span('render'):
+        return await sync_to_async(render)(request, f'fragments/ticker_{section}.html', context)
+
+
+@cache_control(public=True, max_age=settings.CHART_CACHE_TIMEOUT)
+def chart_data(request, ticker):
+    return JsonResponse(get_chart(ticker))
+
+
+@cache_control(public=True, max_age=settings.CHART_CACHE_TIMEOUT)
+async def chart_data_async(request, ticker):
+    return JsonResponse(await aget_chart(ticker))
+
+
+def ticker_context(fundamentals, chart):
+    with span('overview'):
         overview = seven_yrs_overview(fundamentals)
         roi = return_on_investment(fundamentals, overview)
+    with span('projection'):
+        bands = return_bands(fundamentals)
+    with span('scoring'):
         calculated_stock_scoring = stock_scoring(fundamentals)
         overall_score = stock_overall_score(calculated_stock_scoring)
-        form = TickerFormSmall()
-        context = {
-            'fundamentals': fundamentals,
-            '7yrs': overview,
-            'roi': roi,
-            'form': form,
-            'overall_score': overall_score,
-            'score': calculated_stock_scoring,
-            'candlestick': candlestick(ticker),
-        }
-        return render(request, 'ticker.html', context)
-    if request.method == 'POST':
-        form = TickerFormSmall(request.POST)
-        if form.is_valid():
-            ticker = form.cleaned_data['ticker'].upper().strip()
-        return redirect('/ticker/' + ticker + '/')
+    form = TickerFormSmall()
+    return {
+        'fundamentals': fundamentals,
+        '7yrs': overview,
+        'roi': roi,
+        'return_bands': bands,
+        'form': form,
+        'overall_score': overall_score,
+        'score': calculated_stock_scoring,
+        'candlestick': chart,
+        'plotly_version': PLOTLY_VERSION,
+    }
+
+
+def screener(request):
+    # /screener/?symbols=AAPL,MSFT&format=csv - rows are streamed as the symbols are valued
+    symbols = parse_symbols(request.GET.get('symbols', ''))
+    output_format = request.GET.get('format', 'ndjson')
+    if not symbols:
+        return HttpResponseBadRequest('No symbols given.')
+    if len(symbols) > settings.SCREENER_MAX_SYMBOLS:
+        return HttpResponseBadRequest(f'At most {settings.SCREENER_MAX_SYMBOLS} symbols per request.')
+    if output_format not in FORMATS:
+        return HttpResponseBadRequest(f"Format has to be one of: {', '.join(FORMATS)}.")
+    rows = screen(symbols, settings.SCREENER_MAX_WORKERS)
+    return StreamingHttpResponse(serialize(rows, output_format), content_type=CONTENT_TYPES[output_format])
+
+
+@conditional_ticker
+def api_valuation(request, ticker):
+    # /api/v1/valuation/AAPL?exclude=description - the numbers of the ticker page as JSON
+    fields, exclude = api_fields(request)
+    try:
+        valuation = api.valuation(ticker, fields, exclude)
+    except UpstreamError as e:
+        return api_error(f'{ticker.upper()}: data source unavailable ({e})', status=503)
+    except CannotValue as e:
+        return api_error(f'{ticker.upper()}: cannot be valued ({e.reason})', status=404)
+    return api_response(valuation)
+
+
+def api_valuations(request):
+    # /api/v1/valuations?symbols=AAPL,MSFT&fields=price,roi - one entry per symbol, in the given order
+    symbols = parse_symbols(request.GET.get('symbols', ''))
+    if not symbols:
+        return api_error('No symbols given.', status=400)
+    if len(symbols) > settings.API_MAX_SYMBOLS:
+        return api_error(f'At most {settings.API_MAX_SYMBOLS} symbols per request.', status=400)
+    fields, exclude = api_fields(request)
+    return api_response({'valuations': api.valuations(symbols, fields, exclude)})
+
+
+def api_fields(request):
+    fields = request.GET.get('fields')
+    return (api.parse_fields(fields) if fields else None), api.parse_fields(request.GET.get('exclude', ''))
+
+
+def api_response(data, status=200):
+    # compact separators, NaN has been replaced by null already so allow_nan=False only guards
+    return JsonResponse({'version': api.VERSION, **data}, status=status,
+                        json_dumps_params={'separators': (',', ':'), 'allow_nan': False})
+
+
+def api_error(message, status):
+    return api_response({'error': message}, status=status)
+
+
+@cache_control(public=True, max_age=24 * 60 * 60)
+def symbol_search(request):
+    # /symbols/?q=app - suggestions for the search box, empty without a listing file
+    index = get_symbol_index()
+    matches = index.complete(request.GET.get('q', ''), limit=10) if index is not None else []
+    return JsonResponse({'symbols': [{'symbol': symbol, 'name': name} for symbol, name in matches]})
+
+
+def metrics_view(request):
+    # only with METRICS_ENABLED, the counters name the symbols looked up
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def shell_context(basic_info):
+    # the chart is always loaded from chart.json here, an inline figure would not fit the shell
+    return {
+        'fundamentals': basic_info,
+        'form': TickerFormSmall(),
+        'progressive': True,
+        'candlestick': None,
+        'plotly_version': PLOTLY_VERSION,
+    }
+
+
+def ticker_redirect(request, form):
+    # POSTs come from ticker pages rendered before the navigation bar searched with GET
+    if form.is_valid():
+        return redirect('/ticker/' + form.cleaned_data['ticker'] + '/')
+    # the search page shows what was wrong with the symbol
+    return render(request, 'search.html', {'form': TickerForm(form.data)})